@@ -0,0 +1,623 @@
+# fit for python 3.9 and lower
+# https://stackoverflow.com/questions/75431587/type-hinting-with-unions-and-collectables-3-9-or-greater
+from __future__ import annotations
+
+from botocore.exceptions import NoCredentialsError, PartialCredentialsError
+import requests
+import json
+import pathlib
+import sys
+import os
+import threading
+import zlib
+from time import sleep, time
+from InquirerPy import inquirer
+from InquirerPy.base.control import Choice
+from byrdocs.parser import command_parser, COMMANDS
+from byrdocs.progress import TransferProgress, TransferTask, TitleStatus
+from byrdocs.yaml_init import ask_for_init, ask_for_confirmation, cancel, collect_metadata, write_metadata    # TODO: 进行模块拆分便于维护，而不是全从这里导入进来
+from byrdocs.history_manager import UploadHistory
+from byrdocs.main_menu import main_menu
+from byrdocs.config import baseURL, config_dir, token_path, LOGIN_TIMEOUT
+from byrdocs.resources import info, error, warn, quote, format_size
+from byrdocs.fingerprint import HashCache, fingerprint, get_file_type, multipart_etag
+from byrdocs.uploader import Uploader, AlreadyExists, ServerError, VerificationError
+from byrdocs.spool import Spool
+from byrdocs import daemon, watch, sync, upload_queue, dupes, pdf_info, zip_inspect, metadata_index, pack, download, metrics, hashing, trace, endpoints, init_flags
+from yaspin import yaspin
+
+
+def interrupt_handler(func):
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except KeyboardInterrupt:
+            cancel()
+            sys.exit(0)
+    return wrapper
+
+def retry_handler(error_description: str, max_retries: int=10, interval=0.1):
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            for i in range(max_retries):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    # print(f"{error_description}: {e}")
+                    if i < max_retries - 1:
+                        # print(f"Retrying... ({i+1}/{max_retries})")
+                        sleep(interval)
+                    else:
+                        print(error(f"{error_description}。 在 {max_retries} 次重试后失败: {e}"))
+                        sys.exit(1)
+        return wrapper
+    return decorator
+
+@retry_handler("登录请求错误", interval=1)    # decorator
+def request_login_data() -> dict[str, str]:
+    return requests.post(f"{endpoints.api.current}/api/auth/login").json()
+
+@interrupt_handler
+@retry_handler("登录错误")
+def request_token(data: dict[str, str]) -> str:
+    try:
+        r = requests.get(data["tokenURL"], timeout=LOGIN_TIMEOUT)
+        r.raise_for_status()
+        r = r.json()
+    except requests.exceptions.Timeout:
+        raise Exception("登录超时")  # raise to retry_handler
+    except requests.exceptions.RequestException as e:
+        raise Exception(f"网络错误: {e}")
+    if not r.get("success", False):
+        raise Exception(f"未知错误: {r}")
+    return r["token"]
+
+@interrupt_handler
+def _ask_for_init(file_name: str=None, manually=False, file_path: str=None) -> str:
+    with trace.span("init", cat="prompt", file=file_name):
+        ask_for_init(file_name, manually, file_path)
+
+@interrupt_handler  # 要加上，不然 Ctrl-C 会被当做未知错误处理
+def file_already_exists(new_filename: str) -> None:
+    action = inquirer.select(
+        message="文件已存在。您是否需要录入元信息？",
+        qmark="🤔",
+        choices=[
+            Choice("init", "录入元信息"),
+            Choice("exit", "退出 byrdocs-cli"),
+        ],
+        default="exit",
+        transformer=lambda result: f"为文件 {new_filename} 录入元信息..." if ("录" in result) else result,
+    ).execute()
+    if action == "init":
+        _ask_for_init(new_filename)
+    else:
+        exit(0)
+
+def find_hosted_members(file: str) -> zip_inspect.HostedReport:
+    """逐个解压 ZIP 的成员，与上传历史和本地元信息文件比对，找出已上传过的成员"""
+    with metadata_index.MetadataIndex() as index:
+        index.refresh()
+        known = index.known_ids()
+    with yaspin(text="正在检查 ZIP 中的文件是否已上传", color="grey"):
+        return zip_inspect.find_hosted(file, known)
+
+def upload_with_daemon(file: str, verify: bool = False) -> str | None:
+    # 守护进程未运行、未登录或中途断开时返回 None，由调用方回退到进程内上传
+    if (result := daemon.forward_upload(file, verify)) is None:
+        return None
+    return daemon_upload_result(result)
+
+def daemon_upload_result(result: dict) -> str:
+    if result["event"] == "exists":
+        file_already_exists(result["key"])
+        exit(1)
+    if result["event"] == "error":
+        print(error(result["message"]))
+        exit(1)
+    return result["key"]
+
+def finish_daemon_upload(result: dict, file: str) -> None:
+    """byrdocs.main 在导入本模块前已经通过守护进程上传完成，在这里显示结果并询问是否录入元信息"""
+    new_filename = daemon_upload_result(result)
+    print(info("文件上传成功！"))
+    print(f"\t文件地址: {baseURL}/files/{new_filename}")
+    ask_to_init(new_filename, file)
+
+def ask_to_init(new_filename: str, file: str) -> None:
+    try:
+        if ask_for_confirmation("是否立即为该文件录入元信息？"):
+            _ask_for_init(new_filename, file_path=file)
+        else:
+            cancel()
+    except KeyboardInterrupt:
+        cancel()
+
+def enqueue_after_failure(file: str) -> None:
+    try:
+        upload_queue.enqueue(file, HashCache())
+    except upload_queue.QueueError as e:
+        print(warn(e))
+    else:
+        print(warn("已加入离线上传队列，网络恢复后使用 byrdocs queue drain 上传。"))
+
+def _collect_during_upload(new_filename: str, file: str, task: TransferTask) -> dict | None:
+    # 上传在后台进行，进度显示在终端标题栏中，不打乱前台的输入界面
+    print(quote("文件正在后台上传，进度显示在终端标题栏中。"))
+    with TitleStatus(task), trace.span("init", cat="prompt", file=new_filename):
+        try:
+            if ask_for_confirmation("是否在上传的同时为该文件录入元信息？"):
+                return collect_metadata(new_filename, file_path=file)
+        except (KeyboardInterrupt, SystemExit):    # 取消录入不影响上传
+            print(warn("已取消录入元信息，上传仍在继续。"))
+    return None
+
+def upload_in_process(file: str, token: str, verify: bool = False, ask_init: bool = False) -> tuple[str, dict | None]:
+    """
+    返回 (文件名, 元信息)。ask_init 为 True 时在后台上传的同时询问并录入元信息，
+    元信息由调用方在上传完成后写入；上传失败时先写入已录入的元信息再退出。
+    """
+    cache = HashCache()
+    record = metrics.UploadRecord("upload")
+    try:
+        with record.phase("hash"):
+            etag = multipart_etag(file, cache) if verify else None     # 先于 fingerprint，一次读取同时得到 MD5
+            new_filename = fingerprint(file, cache)
+    except Exception as e:
+        print(error(f"读取文件出错: {e}"))
+        exit(1)
+    cache.save()
+
+    uploader = Uploader(token)
+    try:
+        with yaspin(color="grey") as spinner, record.phase("handshake"):
+            upload_response_data = uploader.request_upload(new_filename)
+    except AlreadyExists:
+        record.status = "exists"
+        metrics.save(record)
+        file_already_exists(new_filename)
+        exit(1)
+    except ServerError as e:
+        print(error(f"服务器错误: {e}"))    # TODO: 优化失败处理
+        exit(1)
+    except requests.exceptions.RequestException as e:
+        print(error(f"上传文件时出现错误: {e}"))
+        enqueue_after_failure(file)
+        exit(1)
+    except Exception as e:
+        print(error(f"上传文件时出现错误: {e}"))
+        exit(1)
+
+    task = TransferTask("Uploading", os.path.getsize(file))
+    outcome = {}
+
+    def transfer() -> None:
+        try:
+            outcome["status"] = uploader.upload(file, upload_response_data, callback=task, expected_etag=etag,
+                                                record=record)
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            task.finish()
+
+    worker = threading.Thread(target=transfer, name="upload", daemon=True)
+    worker.start()
+    metadata = _collect_during_upload(new_filename, file, task) if ask_init else None
+    if worker.is_alive():
+        with TransferProgress() as progress:
+            progress.track(task)
+            worker.join()
+
+    try:
+        if "error" in outcome:
+            if metadata is not None:
+                write_metadata(metadata)
+            raise outcome["error"]
+        status = outcome["status"]
+    except (NoCredentialsError, PartialCredentialsError) as e:
+        print(error(f"证书错误: {e}"))
+        exit(1)
+    except VerificationError as e:
+        record.status = "failed"
+        metrics.save(record)
+        print(error(f"校验失败: {e}"))
+        exit(1)
+    except Exception as e:
+        record.status = "failed"
+        metrics.save(record)
+        print(error(f"上传文件出错: {e}"))
+        enqueue_after_failure(file)
+        exit(1)
+    record.status = "skipped" if status == "skipped" else "uploaded"
+    metrics.save(record)
+    if status == "skipped":
+        print(info("服务器上已有大小和 ETag 相同的文件，已跳过上传。"))
+    elif status == "replaced":
+        print(warn("服务器上的同名文件与本地不一致，已重新上传。"))
+    UploadHistory().add(pathlib.Path(file).name, new_filename, time())
+    return new_filename, metadata
+
+
+def upload_spool(spool: Spool, token: str, name: str, verify: bool = False, source: str = "stdin") -> str:
+    """上传已暂存的数据，调用方负责关闭 spool"""
+    new_filename = f"{spool.md5}.{spool.file_type}"
+    uploader = Uploader(token)
+    record = metrics.UploadRecord(source, spool.size)
+    try:
+        with yaspin(color="grey"), record.phase("handshake"):
+            upload_response_data = uploader.request_upload(new_filename)
+    except AlreadyExists:
+        record.status = "exists"
+        metrics.save(record)
+        print(warn("文件已存在，无需重复上传。"))
+        print(f"\t文件地址: {baseURL}/files/{new_filename}")
+        exit(1)
+    except (ServerError, requests.exceptions.RequestException) as e:
+        print(error(f"上传文件时出现错误: {e}"))
+        exit(1)
+    try:
+        with TransferProgress() as progress:
+            task = progress.add("Uploading", spool.size)
+            status = uploader.upload(spool.source, upload_response_data, callback=task,
+                                     expected_etag=spool.etag if verify else None, record=record)
+            task.finish()
+    except VerificationError as e:
+        record.status = "failed"
+        metrics.save(record)
+        print(error(f"校验失败: {e}"))
+        exit(1)
+    except Exception as e:
+        record.status = "failed"
+        metrics.save(record)
+        print(error(f"上传文件出错: {e}"))
+        exit(1)
+    record.status = "skipped" if status == "skipped" else "uploaded"
+    metrics.save(record)
+    if status == "skipped":
+        print(info("服务器上已有大小和 ETag 相同的文件，已跳过上传。"))
+    UploadHistory().add(name, new_filename, time())
+    return new_filename
+
+
+def upload_stdin(token: str, verify: bool = False) -> str:
+    """从标准输入读取并上传，数据只读取一次，同时计算 MD5 和文件类型"""
+    if sys.stdin.isatty():
+        print(error("错误：标准输入不是管道或文件，例如: cat a.pdf | byrdocs upload -"))
+        exit(1)
+    try:
+        with yaspin(text="正在读取标准输入", color="grey"):
+            spool = Spool(sys.stdin.buffer, etag=verify)
+    except OSError as e:
+        print(error(f"读取标准输入出错: {e}"))
+        exit(1)
+    with spool:
+        if spool.file_type == "unsupported":
+            print(error("错误：标准输入不是 PDF 或 ZIP 文件。"))
+            exit(1)
+        return upload_spool(spool, token, "<stdin>", verify)
+
+
+def upload_directory(directory: str, token: str, verify: bool = False, workers: int | None = None) -> str:
+    """把目录打包为可复现的 ZIP 并上传，打包结果直接写入暂存区，同时计算 MD5"""
+    with Spool(etag=verify) as spool:
+        try:
+            with yaspin(text="正在打包", color="grey"):
+                count = pack.pack(directory, spool.write, workers=workers)
+                spool.finish()
+        except OSError as e:
+            print(error(f"打包目录出错: {e}"))
+            exit(1)
+        if count == 0:
+            print(error("错误：目录中没有可打包的文件"))
+            exit(1)
+        print(info(f"已打包 {count} 个文件，共 {format_size(spool.size)}"
+                   f"（zlib {zlib.ZLIB_RUNTIME_VERSION}，压缩级别 {pack.LEVEL}）"))
+        name = os.path.basename(os.path.normpath(os.path.abspath(directory))) + ".zip"
+        return upload_spool(spool, token, name, verify, source="pack")
+
+@interrupt_handler
+def main(daemon_tried: bool = False):
+    """daemon_tried 为 True 时 byrdocs.main 已尝试把该文件转发给守护进程并失败，直接在进程内上传"""
+    args = command_parser.parse_args()
+    if args.trace:
+        trace.start(args.trace)
+
+    if args.pack and not args.command:
+        args.command = 'upload'
+
+    prefetched = None
+    if not args.command and not args.file:
+        menu_command = main_menu()  
+        if menu_command.command == 'upload_2':
+            args.command = 'upload'
+            args.file = menu_command.file
+            prefetched = menu_command.prefetch
+        else:
+            args.command = menu_command.command
+
+    if args.command not in COMMANDS:
+        args.file = args.command
+        args.command = 'upload'
+
+    if args.file and not args.command:
+        args.command = 'upload'
+
+    if args.command == 'init':
+        if args.type:
+            exit(init_flags.run(args))
+        if args.file:
+            if (file_type := get_file_type(args.file)) == "unsupported":
+                print(error("错误：不支持的文件格式，仅支持上传 PDF 或 ZIP 文件。"))
+                exit(1)
+            else:
+                _ask_for_init(fingerprint(args.file), file_path=args.file)
+                exit(0)
+        if args.manually:
+            _ask_for_init(None, True)
+        else:
+            _ask_for_init(None, False)
+        exit(0)
+
+    if args.command == 'validate':
+        print(warn("该功能尚未实现"))
+        exit(0)
+
+    if args.command == 'daemon':
+        if not daemon.is_supported():
+            print(error("错误：当前系统不支持 Unix socket，无法启动守护进程。"))
+            exit(1)
+        if args.file == 'stop':
+            if daemon.forward({"command": "stop"}) is None:
+                print(warn("守护进程未运行"))
+            else:
+                print(info("守护进程已停止"))
+        elif args.file == 'status':
+            if (event := daemon.forward({"command": "ping"})) is None:
+                print(warn("守护进程未运行"))
+            else:
+                print(info(f"守护进程运行中 (PID {event['pid']})"))
+        else:
+            print(info(f"守护进程已启动，监听 {daemon.daemon_socket_path}"))
+            print(quote("按 Ctrl-C 停止"))
+            try:
+                daemon.serve()
+            except RuntimeError as e:
+                print(warn(e))
+                exit(1)
+        exit(0)
+
+    if args.command == 'dupes':
+        if not args.file or not os.path.isdir(args.file):
+            print(error("错误：请指定要查找的目录"))
+            exit(1)
+        dupes.report(args.file, workers=args.workers)
+        exit(0)
+
+    if args.command == 'info':
+        if not args.file or not os.path.exists(args.file):
+            print(error("错误：请指定 PDF / ZIP 文件或目录"))
+            exit(1)
+        if args.file.endswith(".zip") and os.path.isfile(args.file):
+            zip_inspect.print_report(report := zip_inspect.inspect(args.file))
+            if report.ok:
+                zip_inspect.print_hosted_report(find_hosted_members(args.file))
+            exit(0 if report.ok else 1)
+        if os.path.isdir(args.file):
+            # 目录中的文件并行提取，每行输出一个 JSON 对象，便于脚本处理
+            files = [path for path, _ in sync.scan(args.file) if path.endswith(".pdf")]
+            for result in pdf_info.extract_many(files, workers=args.workers):
+                print(json.dumps(result, ensure_ascii=False), flush=True)
+        else:
+            result = pdf_info.extract(args.file)
+            print(f"标题: {result['title'] or quote('未知')}")
+            print(f"作者: {'、'.join(result['authors']) or quote('未知')}")
+            print(f"页数: {result['pages'] or quote('未知')}")
+        exit(0)
+
+    if args.command == 'search':
+        if not args.file:
+            print(error("错误：请指定搜索关键词"))
+            exit(1)
+        # 元信息文件默认写入当前目录，之前搜索过的目录也会一并增量更新
+        with metadata_index.MetadataIndex() as index:
+            index.refresh([os.getcwd()], workers=args.workers)
+            results = index.search(args.file)
+        metadata_index.print_results(results)
+        print(quote(f"共 {len(results)} 条结果"))
+        exit(0)
+
+    if args.command == 'missing':
+        if args.file and not os.path.isdir(args.file):
+            print(error(f"错误：目录不存在: {args.file}"))
+            exit(1)
+        with metadata_index.MetadataIndex() as index:
+            index.refresh([args.file or os.getcwd()], workers=args.workers)
+            results = index.missing(args.file)
+        for result in results:
+            print(f"{result['key']}  {quote(result['file'])}")
+        print(quote(f"共 {len(results)} 个文件尚未录入元信息"))
+        exit(0)
+
+    if args.command == 'stats':
+        metrics.report()
+        exit(0)
+
+    if args.command == 'get':
+        targets = [target for target in [args.file] + args.more if target]
+        if targets == ['-']:    # 从标准输入读取，每行一个
+            targets = [line.strip() for line in sys.stdin if line.strip()]
+        if not targets:
+            print(error("错误：请指定要下载的文件 md5 或链接"))
+            exit(1)
+        directory = args.output or "."
+        os.makedirs(directory, exist_ok=True)
+        failed = download.download(targets, directory, connections=args.workers or 8)
+        exit(1 if failed else 0)
+
+    if args.command == 'hash':
+        paths = [path for path in [args.file] + args.more if path]
+        if paths == ['-']:      # 从标准输入读取路径，每行一个
+            paths = [line.rstrip("\n") for line in sys.stdin if line.strip()]
+        if not paths:
+            print(error("错误：请指定要计算的文件或目录"))
+            exit(1)
+        failed = hashing.run(paths, args.format, workers=args.workers)
+        exit(1 if failed else 0)
+
+    if args.command == 'queue' and args.file != 'drain':
+        if not args.file or args.file == 'status':
+            upload_queue.status()
+            exit(0)
+        try:
+            job = upload_queue.enqueue(args.file, cache := HashCache())
+            cache.save()
+        except FileNotFoundError:
+            print(error(f"未找到文件: {args.file}"))
+            exit(1)
+        except upload_queue.QueueError as e:
+            print(error(e))
+            exit(1)
+        print(info(f"已加入上传队列: {job['key']}"))
+        exit(0)
+
+    if not config_dir.exists():
+        config_dir.mkdir(parents=True)
+
+    def login(token=None):
+        if token:
+            with token_path.open("w") as f:
+                f.write(token)
+            print(info(f"登录凭证已保存到 {token_path.absolute()}"))
+            return
+
+        if token_path.exists():
+            print(warn("已登录，byrdocs logout 以退出登录"))
+            exit(1)
+
+        print(info("未检测到登录信息，正在请求登录..."))
+        # token = request_token()
+        login_data = request_login_data()
+        print(info("请在浏览器中访问以下链接进行登录:"))
+        print("\t" + login_data["loginURL"])
+        token = request_token(login_data)
+
+        with token_path.open("w") as f:
+            f.write(token)
+        print(info(f"登录成功，凭证已保存到 {token_path.absolute()}"))
+
+    if args.command == 'login':
+        login(args.token)
+        exit(0)
+
+    if not token_path.exists():
+        login()
+
+    if args.command == 'logout':
+        if ask_for_confirmation("确认登出？"):
+            os.remove(token_path)
+            print(info(f"登出成功"))
+        exit(0)
+
+    with token_path.open("r") as f:
+        token = f.read().strip()
+
+    if args.command == 'watch':
+        if not args.file or not os.path.isdir(args.file):
+            print(error("错误：请指定要监视的目录"))
+            exit(1)
+        print(info(f"正在监视 {os.path.abspath(args.file)}，新文件写入完成后将自动上传"))
+        print(quote("按 Ctrl-C 停止"))
+        watch.watch_and_upload(args.file, token, workers=args.workers or 4, polling=args.poll, verify=args.verify)
+        exit(0)
+
+    if args.command == 'sync':
+        if not args.file or not os.path.isdir(args.file):
+            print(error("错误：请指定要同步的目录"))
+            exit(1)
+        exit(1 if sync.sync(args.file, token, dry_run=args.dry_run, workers=args.workers or 4, verify=args.verify) else 0)
+
+    if args.command == 'queue':
+        try:
+            remaining = upload_queue.drain(token, workers=args.workers or 4, verify=args.verify)
+        except upload_queue.QueueError as e:
+            print(error(e))
+            exit(1)
+        if remaining:
+            print(warn(f"仍有 {remaining} 个文件未能上传，使用 byrdocs queue status 查看详情"))
+            exit(1)
+        print(info("上传队列已清空。"))
+        exit(0)
+
+    if args.command == 'upload' and args.pack:
+        if not os.path.isdir(args.pack):
+            print(error(f"错误：目录不存在: {args.pack}"))
+            exit(1)
+        new_filename = upload_directory(args.pack, token, args.verify, workers=args.workers)
+        print(info("文件上传成功！"))
+        print(f"\t文件地址: {baseURL}/files/{new_filename}")
+        try:
+            if ask_for_confirmation("是否立即为该文件录入元信息？"):
+                _ask_for_init(new_filename)
+            else:
+                cancel()
+        except KeyboardInterrupt:
+            cancel()
+        exit(0)
+
+    if args.command == 'upload' or args.file:
+        if not args.file:
+            print(error("错误：未指定要上传的文件"))
+            print(warn("使用 byrdocs -h 获取帮助"))
+            exit(1)
+
+        file = args.file
+
+        if file == '-':
+            # 标准输入已被占用，无法交互，上传后不再询问是否录入元信息
+            new_filename = upload_stdin(token, args.verify)
+            print(info("文件上传成功！"))
+            print(f"\t文件地址: {baseURL}/files/{new_filename}")
+            print(quote(f"使用 byrdocs init 为该文件录入元信息，文件 MD5: {new_filename[:-4]}"))
+            exit(0)
+
+        try:
+            if (file_type := get_file_type(file)) == "unsupported":
+                print(error(f"错误：不支持的文件格式 `{str(file).split('.')[-1]}` 或文件损坏，仅支持上传 PDF 或 ZIP 文件。"))
+                exit(1)
+        except FileNotFoundError:
+            print(error(f"未找到文件: {file}"))
+            exit(1)
+        except Exception as e:
+            print(error(f"读取文件出错: {e}"))
+            exit(1)
+
+        if prefetched is not None:
+            # 输入路径时已在后台计算，通常已经完成；等待其写入哈希缓存，之后不必重新计算
+            with yaspin(text="正在计算文件哈希", color="grey"):
+                prefetched.wait()
+            if prefetched.exists and prefetched.key is not None:
+                # 输入路径时已确认服务器上存在该文件，不再申请上传
+                file_already_exists(prefetched.key)
+                exit(1)
+
+        if file_type == "zip":
+            # 上传前预览 ZIP 内容，只读取中央目录
+            zip_inspect.print_report(report := zip_inspect.inspect(file))
+            if not report.ok and not ask_for_confirmation("ZIP 文件存在以上问题，是否仍要上传？"):
+                cancel()
+            if report.ok:
+                # 压缩炸弹不解压；大部分内容已单独上传过时，让用户决定是否仍要上传
+                zip_inspect.print_hosted_report(hosted := find_hosted_members(file))
+                if hosted.ratio >= zip_inspect.HOSTED_RATIO and not ask_for_confirmation("ZIP 中的大部分内容已上传过，是否仍要上传？"):
+                    cancel()
+
+        if daemon_tried or (new_filename := upload_with_daemon(file, args.verify)) is None:
+            new_filename, metadata = upload_in_process(file, token, args.verify, ask_init=True)
+            print(info("文件上传成功！"))
+            print(f"\t文件地址: {baseURL}/files/{new_filename}")
+            if metadata is not None:
+                write_metadata(metadata)
+            exit(0)
+        print(info("文件上传成功！"))
+        print(f"\t文件地址: {baseURL}/files/{new_filename}")
+        ask_to_init(new_filename, file)
@@ -0,0 +1,36 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import os
+import pathlib
+
+
+def _urls(name: str, default: str) -> list[str]:
+    return [url.strip().rstrip("/") for url in os.environ.get(name, default).split(",") if url.strip()] or [default]
+
+
+# 可以用环境变量指向其他服务器，例如镜像或本地的 `python -m byrdocs.mock_server`。
+# 用逗号分隔多个候选地址时，由 byrdocs.endpoints 测速选择并在出错时切换
+base_urls = _urls("BYRDOCS_BASE_URL", "https://byrdocs.org")
+s3_endpoints = _urls("BYRDOCS_S3_ENDPOINT", "https://s3.byrdocs.org")
+s3_region = os.environ.get("BYRDOCS_S3_REGION", "us-east-1")
+baseURL = base_urls[0]      # 展示给用户的文件地址始终使用第一个
+LOGIN_TIMEOUT = float(os.environ.get("BYRDOCS_LOGIN_TIMEOUT", 120))    # 登录时等待浏览器授权的长轮询超时
+
+# https://blog.csdn.net/weixin_44123540/article/details/118492260
+# 对于上传 100MB 的文件会有限制，需要分块上传
+MB = 1024**2
+MULTIPART_THRESHOLD = 100 * MB
+MULTIPART_CHUNKSIZE = 50 * MB
+
+config_dir = pathlib.Path.home() / ".config" / "byrdocs"
+token_path = config_dir / "token"
+hash_cache_path = config_dir / "hash_cache.json"
+daemon_socket_path = config_dir / "daemon.sock"
+endpoints_cache_path = config_dir / "endpoints.json"
+
+
+def ensure_config_dir() -> pathlib.Path:
+    if not config_dir.exists():
+        config_dir.mkdir(parents=True, exist_ok=True)
+    return config_dir
@@ -95,3 +95,28 @@ class FilePathCompleter(Completer):
 
         yield from file_completions
         yield from dir_completions
+
+
+class FilePathPrompt(InputPrompt):
+    """
+    InputPrompt 的基础上，输入内容每次变化时调用 on_change，用于在用户确认前预先处理输入的路径；
+    status 返回的文字显示在 long_instruction 之后，内容变化时由其他线程调用 refresh 重绘。
+    """
+
+    def __init__(self, *args, on_change: Optional[Callable[[str], None]] = None,
+                 status: Optional[Callable[[], str]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if status is not None:
+            long_instruction = kwargs.get("long_instruction", "")
+            self._session.bottom_toolbar = lambda: [
+                ("class:long_instruction", "  ".join(text for text in (long_instruction, status()) if text))
+            ]
+        if on_change is not None:
+            def handler(buffer) -> None:
+                # 按下 Enter 后输入框会被清空，此时不再通知
+                if not self.status["answered"]:
+                    on_change(buffer.text)
+            self._session.default_buffer.on_text_changed += handler
+
+    def refresh(self) -> None:
+        self._session.app.invalidate()     # 可在其他线程中调用
@@ -0,0 +1,253 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import socket
+import socketserver
+import threading
+from time import time
+from typing import Callable
+
+from byrdocs.config import token_path, daemon_socket_path, ensure_config_dir
+from byrdocs.fingerprint import HashCache, fingerprint, get_file_type, multipart_etag
+from byrdocs.history_manager import UploadHistory
+from byrdocs.resources import warn
+
+'''
+守护进程常驻内存，保持登录凭证、哈希缓存、上传历史和网络连接池，
+客户端通过本地 Unix socket 转发命令，避免每次调用的冷启动开销。
+
+Protocol (one JSON object per line):
+    client -> daemon: {"command": "upload", "file": "/abs/path.pdf"}
+    daemon -> client: {"event": "fingerprint", "key": "<md5>.pdf"}
+                      {"event": "start", "key": "<md5>.pdf", "total": 12345}
+                      {"event": "progress", "bytes": 4096}
+                      {"event": "done" | "exists" | "error", ...}    # 最后一条
+'''
+
+FINAL_EVENTS = ("done", "exists", "error", "pong", "ok")
+PROGRESS_INTERVAL = 0.1     # 进度事件的最小发送间隔（秒）
+
+
+def _mtime(path: pathlib.Path) -> float | None:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class DaemonState:
+    def __init__(self):
+        self.cache = HashCache()
+        self._lock = threading.Lock()
+        self._token: str | None = None
+        self._token_mtime: float | None = None
+        self._uploader = None
+
+    def uploader(self):
+        """登录凭证变化（登录、登出）后重新创建上传器，否则复用已有连接。"""
+        with self._lock:
+            mtime = _mtime(token_path)
+            if mtime is None:
+                self._token, self._token_mtime, self._uploader = None, None, None
+                return None
+            if mtime != self._token_mtime:
+                from byrdocs.uploader import Uploader    # 首次使用时才导入 boto3
+                with token_path.open("r") as f:
+                    self._token = f.read().strip()
+                self._token_mtime = mtime
+                self._uploader = Uploader(self._token)
+            return self._uploader
+
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self._write_lock = threading.Lock()
+
+    def send(self, **event) -> None:
+        with self._write_lock:
+            self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            self.send(event="error", message="无法解析的请求")
+            return
+        if not isinstance(request, dict):
+            self.send(event="error", message="无法解析的请求")
+            return
+        command = request.get("command")
+        if command == "ping":
+            self.send(event="pong", pid=os.getpid())
+        elif command == "stop":
+            self.send(event="ok")
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif command == "upload":
+            if not isinstance(file := request.get("file"), str) or not file:
+                self.send(event="error", message="请求中缺少要上传的文件")
+                return
+            self.upload(file, bool(request.get("verify", False)))
+        else:
+            self.send(event="error", message=f"不支持的命令: {command}")
+
+    def upload(self, file: str, verify: bool = False) -> None:
+        from byrdocs import metrics
+        from byrdocs.uploader import AlreadyExists, ServerError, VerificationError
+
+        state: DaemonState = self.server.state
+        if (uploader := state.uploader()) is None:
+            self.send(event="error", reason="unauthorized", message="未登录")
+            return
+        try:
+            if get_file_type(file) == "unsupported":
+                self.send(event="error", reason="unsupported", message="不支持的文件格式")
+                return
+            record = metrics.UploadRecord("daemon")
+            if state.cache.lookup(file) is None:
+                state.cache.reload()    # 客户端可能已在主菜单中预先计算并保存了哈希
+            with record.phase("hash"):
+                etag = multipart_etag(file, state.cache) if verify else None
+                key = fingerprint(file, state.cache)
+            state.cache.save()
+        except Exception as e:
+            self.send(event="error", message=f"读取文件出错: {e}")
+            return
+        self.send(event="fingerprint", key=key)
+
+        try:
+            with record.phase("handshake"):
+                upload_response_data = uploader.request_upload(key)
+        except AlreadyExists:
+            record.status = "exists"
+            metrics.save(record)
+            self.send(event="exists", key=key)
+            return
+        except ServerError as e:
+            self.send(event="error", message=f"服务器错误: {e}")
+            return
+        except Exception as e:
+            self.send(event="error", message=f"上传文件时出现错误: {e}")
+            return
+
+        self.send(event="start", key=key, total=os.path.getsize(file))
+        pending = [0, time()]   # 累计未发送的字节数和上次发送时间
+        pending_lock = threading.Lock()
+
+        def callback(chunk: int) -> None:
+            with pending_lock:
+                pending[0] += chunk
+                if time() - pending[1] < PROGRESS_INTERVAL:
+                    return
+                chunk, pending[0], pending[1] = pending[0], 0, time()
+            self.send(event="progress", bytes=chunk)
+
+        try:
+            status = uploader.upload(file, upload_response_data, callback=callback, expected_etag=etag, record=record)
+            record.status = "skipped" if status == "skipped" else "uploaded"
+        except VerificationError as e:
+            record.status = "failed"
+            self.send(event="error", message=f"校验失败: {e}")
+            return
+        except Exception as e:
+            record.status = "failed"
+            self.send(event="error", message=f"上传文件出错: {e}")
+            return
+        finally:
+            metrics.save(record)
+        if pending[0]:
+            self.send(event="progress", bytes=pending[0])
+        if status == "skipped":
+            self.send(event="message", message="服务器上已有大小和 ETag 相同的文件，已跳过上传。")
+        elif status == "replaced":
+            self.send(event="message", message="服务器上的同名文件与本地不一致，已重新上传。")
+        UploadHistory().add(pathlib.Path(file).name, key, time())
+        self.send(event="done", key=key)
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def is_supported() -> bool:
+    return hasattr(socket, "AF_UNIX")
+
+
+def forward(request: dict, on_event: Callable[[dict], None] | None = None) -> dict | None:
+    """
+    将命令转发给守护进程，返回最后一条事件。
+    守护进程未运行或中途断开时返回 None，调用方应回退到进程内执行。
+    """
+    if not is_supported() or not daemon_socket_path.exists():
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(daemon_socket_path))
+    except OSError:
+        sock.close()
+        return None
+    with sock, sock.makefile("rwb") as f:
+        f.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        f.flush()
+        for line in f:
+            event = json.loads(line)
+            if event.get("event") in FINAL_EVENTS:
+                return event
+            if on_event is not None:
+                on_event(event)
+    return None
+
+
+def forward_upload(file: str, verify: bool = False) -> dict | None:
+    """
+    转发上传命令并显示进度，返回最后一条事件（done、exists 或 error）。
+    守护进程未运行、未登录或中途断开时返回 None。只导入 tqdm，不导入 boto3 和 InquirerPy。
+    """
+    from byrdocs.progress import TransferProgress
+
+    task = None
+
+    def on_event(event: dict) -> None:
+        nonlocal task
+        if event["event"] == "start":
+            task = progress.add("Uploading", event["total"])
+        elif event["event"] == "progress" and task is not None:
+            task(event["bytes"])
+        elif event["event"] == "message":
+            progress.write(warn(event["message"]))
+
+    with TransferProgress() as progress:
+        result = forward({"command": "upload", "file": os.path.abspath(file), "verify": verify}, on_event)
+        if task is not None:
+            task.finish()
+    if result is None or result.get("reason") == "unauthorized":
+        return None
+    return result
+
+
+def serve() -> None:
+    if forward({"command": "ping"}) is not None:
+        raise RuntimeError(f"守护进程已在运行: {daemon_socket_path}")
+    ensure_config_dir()
+    if daemon_socket_path.exists():     # 上次异常退出残留的 socket 文件
+        daemon_socket_path.unlink()
+    # socket 在 bind 时以 0600 创建，其他用户无法在设置权限前连接并使用缓存的登录凭据
+    umask = os.umask(0o177)
+    try:
+        server = _Server(str(daemon_socket_path), _Handler)
+    finally:
+        os.umask(umask)
+    server.state = DaemonState()
+    server.state.uploader()     # 预先导入 boto3 并建立会话
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.state.cache.save()
+        if daemon_socket_path.exists():
+            daemon_socket_path.unlink()
@@ -0,0 +1,255 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from byrdocs import endpoints
+from byrdocs.config import MB
+from byrdocs.fingerprint import CHUNK_SIZE, format_filename
+
+'''
+从 BYR Docs 下载文件。
+
+每个文件按 PART_SIZE 分块，用 HTTP Range 请求并发下载，写入 `<md5>.<ext>.part` 的对应位置；
+已完成的分块记录在 `<md5>.<ext>.part.json` 中，中断后再次运行只下载剩余分块。下载完成后
+校验 MD5（即文件名），一致才重命名为最终文件。所有文件的分块共用一个线程池和一个连接池，
+同时打开的连接数不超过 connections。
+'''
+
+PART_SIZE = 8 * MB
+STREAM_CHUNK = 256 * 1024
+TIMEOUT = 30
+
+
+class DownloadError(Exception):
+    pass
+
+
+def resolve(target: str, session: requests.Session) -> str:
+    """把 md5、文件名或链接解析为 `<md5>.<pdf|zip>`，只给出 md5 时向服务器探测扩展名"""
+    if (file_name := format_filename(target)) is not None:
+        return file_name
+    md5 = target.strip().lower()
+    if len(md5) == 32 and all(c in "0123456789abcdef" for c in md5):
+        for suffix in (".pdf", ".zip"):
+            response = session.head(f"{endpoints.api.current}/files/{md5}{suffix}", allow_redirects=True, timeout=TIMEOUT)
+            if response.ok:
+                return md5 + suffix
+        raise DownloadError(f"服务器上不存在: {md5}")
+    raise DownloadError(f"无法识别的文件: {target}")
+
+
+def _validator(headers) -> str | None:
+    """用于判断服务器上的文件是否变化，优先使用强 ETag，其次是 Last-Modified，最后才是弱 ETag"""
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified") or etag
+
+
+def _if_range(validator: str | None) -> str | None:
+    # RFC 9110 13.1.5：If-Range 只能使用强 ETag 或日期，弱 ETag 会让服务器返回 200 和整个文件
+    if not validator or validator.startswith("W/"):
+        return None
+    return validator
+
+
+class _Download:
+    """一个文件的下载状态，分块完成情况保存在 .part.json 中"""
+
+    def __init__(self, file_name: str, directory: str, size: int, validator: str | None):
+        self.file_name = file_name
+        self.url = f"{endpoints.api.current}/files/{file_name}"
+        self.path = os.path.join(directory, file_name)
+        self.part_path = self.path + ".part"
+        self.state_path = self.part_path + ".json"
+        self.size = size
+        self.validator = validator      # ETag 或 Last-Modified，服务器上的文件变化时不能续传
+        self.lock = threading.Lock()
+        self.restarted = False      # 服务器返回了整个文件，已改为从头写入
+        self.done: set[int] = set()
+        self.parts = [(start, min(start + PART_SIZE, size)) for start in range(0, size, PART_SIZE)]
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.state_path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = None
+        if (state is not None and state.get("size") == self.size and state.get("validator") == self.validator
+                and state.get("part_size") == PART_SIZE and os.path.exists(self.part_path)):
+            self.done = set(state.get("done", []))
+            return
+        with open(self.part_path, "wb") as f:
+            f.truncate(self.size)   # 预先分配，各分块直接写到对应位置
+        self._save()
+
+    def _save(self) -> None:
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"size": self.size, "validator": self.validator, "part_size": PART_SIZE,
+                       "done": sorted(self.done)}, f)
+        os.replace(tmp_path, self.state_path)
+
+    @property
+    def remaining(self) -> list[int]:
+        return [index for index in range(len(self.parts)) if index not in self.done]
+
+    @property
+    def downloaded(self) -> int:
+        return sum(self.parts[index][1] - self.parts[index][0] for index in self.done)
+
+    def fetch(self, session: requests.Session, index: int, callback=None) -> None:
+        start, end = self.parts[index]
+        if self.restarted:
+            return
+        headers = {"Range": f"bytes={start}-{end - 1}"}
+        if (if_range := _if_range(self.validator)) is not None:
+            headers["If-Range"] = if_range
+        with session.get(self.url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+            if response.status_code == 200:
+                self._restart(response, callback)
+                return
+            if response.status_code != 206:
+                raise DownloadError(f"服务器不支持分块下载 (HTTP {response.status_code})")
+            received = 0
+            with open(self.part_path, "r+b") as f:
+                for chunk in response.iter_content(STREAM_CHUNK):
+                    with self.lock:     # 改为从头写入后，其他分块不能再写入
+                        if self.restarted:
+                            return
+                        f.seek(start + received)
+                        f.write(chunk)
+                    received += len(chunk)
+                    if callback is not None:
+                        callback(len(chunk))
+        if received != end - start:
+            raise DownloadError(f"分块不完整: {received}/{end - start} 字节")
+        with self.lock:
+            self.done.add(index)
+            self._save()
+
+    def _restart(self, response: requests.Response, callback=None) -> None:
+        """服务器上的文件已变化或忽略了 Range，返回了整个文件：清空已下载的部分，从第 0 字节开始写入"""
+        with self.lock:
+            if self.restarted:
+                return      # 其他分块已经在从头写入
+            self.restarted = True
+            self.done.clear()
+            self.validator = _validator(response.headers)
+            self._save()
+            with open(self.part_path, "r+b") as f:
+                f.truncate(0)
+        with open(self.part_path, "r+b") as f:
+            for chunk in response.iter_content(STREAM_CHUNK):
+                f.write(chunk)
+                if callback is not None:
+                    callback(len(chunk))
+        with self.lock:
+            self.done = set(range(len(self.parts)))
+            self._save()
+
+    def finish(self) -> None:
+        md5 = hashlib.md5()
+        with open(self.part_path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                md5.update(chunk)
+        if md5.hexdigest() != self.file_name[:32]:
+            # 内容有误时无法确定是哪一块出错，只能重新下载
+            os.remove(self.part_path)
+            os.remove(self.state_path)
+            raise DownloadError("MD5 校验失败，已删除下载的数据，请重新下载")
+        os.replace(self.part_path, self.path)
+        os.remove(self.state_path)
+
+
+def _stream_whole(session: requests.Session, url: str, path: str, callback=None) -> None:
+    """服务器不支持 Range 时整体下载"""
+    md5 = hashlib.md5()
+    part_path = path + ".part"
+    with session.get(url, stream=True, timeout=TIMEOUT) as response:
+        response.raise_for_status()
+        with open(part_path, "wb") as f:
+            for chunk in response.iter_content(STREAM_CHUNK):
+                f.write(chunk)
+                md5.update(chunk)
+                if callback is not None:
+                    callback(len(chunk))
+    if md5.hexdigest() != os.path.basename(path)[:32]:
+        os.remove(part_path)
+        raise DownloadError("MD5 校验失败，已删除下载的数据，请重新下载")
+    os.replace(part_path, path)
+
+
+def create_session(connections: int) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections, pool_block=True)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def download(targets: list[str], directory: str = ".", connections: int = 8) -> int:
+    """下载多个文件，返回失败的文件数"""
+    from byrdocs.progress import TransferProgress
+    from byrdocs.resources import info, error, warn
+
+    session = create_session(connections)
+    failed: list[str] = []
+
+    def fail(name: str, message: str) -> None:
+        failed.append(name)
+        progress.write(error(f"下载失败: {name}: {message}"))
+
+    with TransferProgress(show_total=len(targets) > 1) as progress, \
+            ThreadPoolExecutor(max_workers=connections) as executor:
+        # 先解析并 HEAD 所有文件，再把所有文件的分块一起交给线程池
+        scheduled = []
+        for target in targets:
+            try:
+                file_name = resolve(target, session)
+                path = os.path.join(directory, file_name)
+                if os.path.exists(path):
+                    progress.write(warn(f"已存在，跳过: {path}"))
+                    continue
+                response = session.head(f"{endpoints.api.current}/files/{file_name}", allow_redirects=True, timeout=TIMEOUT)
+                response.raise_for_status()
+                size = int(response.headers.get("Content-Length", 0))
+                task = progress.add(file_name, size)
+                if response.headers.get("Accept-Ranges") != "bytes" or size == 0:
+                    item = None
+                    futures = [executor.submit(_stream_whole, session, response.url, path, task)]
+                else:
+                    item = _Download(file_name, directory, size, _validator(response.headers))
+                    task(item.downloaded)
+                    futures = [executor.submit(item.fetch, session, index, task) for index in item.remaining]
+                scheduled.append((file_name, path, item, task, futures))
+            except (DownloadError, requests.RequestException, OSError) as e:
+                fail(target, str(e))
+
+        for file_name, path, item, task, futures in scheduled:
+            errors = []
+            for future in futures:
+                try:
+                    future.result()
+                except (DownloadError, requests.RequestException, OSError) as e:
+                    errors.append(str(e))
+            task.finish()
+            try:
+                if errors:
+                    raise DownloadError(errors[0] + ("（已下载的部分会保留，重新运行可继续）" if item is not None else ""))
+                if item is not None:
+                    item.finish()
+            except (DownloadError, OSError) as e:
+                fail(file_name, str(e))
+            else:
+                progress.write(info(f"已下载: {path}"))
+    return len(failed)
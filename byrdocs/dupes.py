@@ -0,0 +1,91 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from byrdocs.fingerprint import HashCache, file_md5, get_file_type
+from byrdocs.sync import scan
+
+'''
+查找目录中内容相同的文件，依次按大小、首尾片段哈希、完整 MD5 分组，
+每一步只对上一步仍可能重复的文件继续读取，大部分文件只需 stat 或读取两小段。
+'''
+
+PARTIAL_SIZE = 64 * 1024
+
+
+def partial_hash(file: str) -> str:
+    """文件开头和结尾各 PARTIAL_SIZE 字节的哈希"""
+    md5 = hashlib.md5()
+    with open(file, "rb") as f:
+        md5.update(f.read(PARTIAL_SIZE))
+        size = os.fstat(f.fileno()).st_size
+        if size > PARTIAL_SIZE:
+            f.seek(max(PARTIAL_SIZE, size - PARTIAL_SIZE))
+            md5.update(f.read(PARTIAL_SIZE))
+    return md5.hexdigest()
+
+
+def _regroup(groups: list[list[str]], key, executor: ProcessPoolExecutor) -> list[list[str]]:
+    files = [file for group in groups for file in group]
+    keys = executor.map(key, files, chunksize=16)
+    buckets: dict[tuple, list[str]] = defaultdict(list)
+    # 键中带上组号，不同组的文件不会因片段哈希碰巧相同而合并
+    group_of = {file: index for index, group in enumerate(groups) for file in group}
+    for file, value in zip(files, keys):
+        buckets[(group_of[file], value)].append(file)
+    return [group for group in buckets.values() if len(group) > 1]
+
+
+def find_duplicates(directory: str, cache: HashCache | None = None, workers: int | None = None) -> list[list[str]]:
+    by_size: dict[int, list[str]] = defaultdict(list)
+    for path, stat in scan(directory):
+        if stat.st_size > 0:
+            by_size[stat.st_size].append(path)
+    groups = [group for group in by_size.values() if len(group) > 1]
+    if not groups:
+        return []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        groups = _regroup(groups, partial_hash, executor)
+        # 完整哈希优先使用缓存，未命中的文件才交给进程池
+        md5s: dict[str, str] = {}
+        missing = []
+        for file in (file for group in groups for file in group):
+            if cache is not None and (entry := cache.lookup(file)) is not None and entry["md5"]:
+                md5s[file] = entry["md5"]
+            else:
+                missing.append(file)
+        for file, md5 in zip(missing, executor.map(file_md5, missing)):
+            md5s[file] = md5
+            if cache is not None:
+                cache.store(file, md5, get_file_type(file))
+    by_md5: dict[tuple[int, str], list[str]] = defaultdict(list)
+    for group in groups:
+        for file in group:
+            by_md5[(os.path.getsize(file), md5s[file])].append(file)
+    return sorted((sorted(group) for group in by_md5.values() if len(group) > 1), key=lambda group: group[0])
+
+
+def report(directory: str, workers: int | None = None) -> int:
+    """输出重复文件分组，返回可节省的字节数"""
+    from byrdocs.resources import info, quote, format_size
+
+    cache = HashCache()
+    groups = find_duplicates(directory, cache, workers)
+    cache.save()
+    if not groups:
+        print(info("未发现重复文件。"))
+        return 0
+    wasted = 0
+    for group in groups:
+        size = os.path.getsize(group[0])
+        wasted += size * (len(group) - 1)
+        print(info(f"{len(group)} 个相同文件，每个 {format_size(size)}:"))
+        for file in group:
+            print(quote(f"\t{file}"))
+    print(info(f"共 {len(groups)} 组重复文件，去重后可减少 {format_size(wasted)}"))
+    return wasted
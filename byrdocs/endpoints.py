@@ -0,0 +1,133 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from byrdocs import trace
+from byrdocs.config import base_urls, s3_endpoints, endpoints_cache_path, ensure_config_dir
+
+'''
+在多个候选的 API / S3 地址中选择最快的一个，并在批量上传途中出错时切换到下一个。
+
+只有一个候选地址（默认情况）时不测速，没有任何额外开销。有多个候选地址时，第一次使用前
+并发向每个地址发送两次 HEAD 请求，取较快的一次作为延迟（第一次包含 TLS 握手），
+按延迟排序。测速结果缓存在 endpoints.json 中 CACHE_TTL 秒，期间启动的进程直接使用缓存。
+
+只测延迟，不测带宽：S3 地址在取得上传凭证前无法下载任何对象，API 地址也没有固定的测试文件，
+因此延迟低但带宽小的地址同样会排在前面。这类地址可以从候选中去掉，或在出错时由 fail() 切换。
+
+连接失败、超时或返回 5xx 时调用 fail() 把该地址标记为不可用，并记入缓存，
+之后的请求（包括其他进程）改用下一个地址；所有地址都不可用时重新从最快的开始尝试。
+
+Cache file format:
+{
+    "api": {
+        "https://byrdocs.org": {"latency": 0.035, "time": 1733110485.5},
+        "https://mirror.example": {"latency": null, "time": 1733110485.5}     # 不可用
+    },
+    "s3": {...}
+}
+'''
+
+PROBE_TIMEOUT = 3
+CACHE_TTL = 600
+
+
+def probe(url: str) -> float | None:
+    """返回地址的延迟（秒，只测量 HEAD 请求的往返时间，不反映带宽），无法连接或返回 5xx 时返回 None"""
+    import requests
+
+    best = None
+    with requests.Session() as session:
+        for _ in range(2):
+            start = time.perf_counter()
+            try:
+                response = session.head(f"{url}/", timeout=PROBE_TIMEOUT, allow_redirects=False)
+            except requests.RequestException:
+                return None
+            if response.status_code >= 500:     # S3 根路径通常返回 403，同样说明可以连接
+                return None
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _read_cache() -> dict:
+    try:
+        with endpoints_cache_path.open("r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _update_cache(kind: str, results: dict[str, float | None]) -> None:
+    try:
+        ensure_config_dir()
+        cache = _read_cache()
+        now = time.time()
+        cache.setdefault(kind, {}).update({url: {"latency": latency, "time": now} for url, latency in results.items()})
+        tmp_path = endpoints_cache_path.with_name(f"{endpoints_cache_path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("w") as f:
+            json.dump(cache, f, indent=4)
+        os.replace(tmp_path, endpoints_cache_path)
+    except OSError:
+        pass    # 缓存写入失败不影响上传
+
+
+class EndpointSelector:
+    def __init__(self, kind: str, candidates: list[str]):
+        self.kind = kind
+        self.candidates = candidates
+        self._ranked: list[str] | None = None
+        self._failed: set[str] = set()
+        self._lock = threading.Lock()
+
+    def _rank(self) -> list[str]:
+        cached = _read_cache().get(self.kind, {})
+        now = time.time()
+        latencies: dict[str, float | None] = {}
+        for url in self.candidates:
+            entry = cached.get(url)
+            if entry is not None and now - entry.get("time", 0) < CACHE_TTL:
+                latencies[url] = entry.get("latency")
+        missing = [url for url in self.candidates if url not in latencies]
+        if missing:
+            with trace.span("probe", cat="network", kind=self.kind), \
+                    ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                probed = dict(zip(missing, executor.map(probe, missing)))
+            _update_cache(self.kind, probed)
+            latencies.update(probed)
+        # 不可用的地址排在最后，延迟相同时保持配置中的顺序
+        return sorted(self.candidates, key=lambda url: math.inf if latencies[url] is None else latencies[url])
+
+    @property
+    def current(self) -> str:
+        if len(self.candidates) == 1:
+            return self.candidates[0]
+        with self._lock:
+            if self._ranked is None:
+                self._ranked = self._rank()
+            for url in self._ranked:
+                if url not in self._failed:
+                    return url
+            self._failed.clear()    # 全部失败过时重新从最快的开始
+            return self._ranked[0]
+
+    def fail(self, url: str) -> bool:
+        """把地址标记为不可用，返回是否还有其他可用的地址可以重试"""
+        if len(self.candidates) == 1:
+            return False
+        with self._lock:
+            self._failed.add(url)
+            available = any(candidate not in self._failed for candidate in self.candidates)
+        _update_cache(self.kind, {url: None})
+        return available
+
+
+api = EndpointSelector("api", base_urls)
+s3 = EndpointSelector("s3", s3_endpoints)
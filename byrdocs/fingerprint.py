@@ -0,0 +1,277 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import threading
+from contextlib import contextmanager
+
+from byrdocs import trace
+from byrdocs.config import baseURL, hash_cache_path, MULTIPART_THRESHOLD, MULTIPART_CHUNKSIZE
+
+CHUNK_SIZE = 8 * 1024**2    # 分块读取，避免大文件整个读入内存
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+'''
+Cache file format:
+{
+    "/abs/path/to/file.pdf": {
+        "size": 12345,
+        "mtime_ns": 1733110485531392000,
+        "md5": "md5",
+        "type": "pdf",
+        "etag": "md5-3"     # 可选，见 multipart_etag
+    }
+}
+'''
+
+
+def get_file_type(file: pathlib.Path | str) -> str:
+    # https://en.wikipedia.org/wiki/List_of_file_signatures
+    # use magic number to check file type, together with suffix
+    with open(file, "rb") as f:
+        magic_number = f.read(4)
+        file_name: str = file
+        if type(file) in (pathlib.PosixPath, pathlib.WindowsPath, pathlib.Path):
+            # 若不如此提取，类 unix 系统中可能传入 PosixPath 类型的 file，出现 bug
+            file_name = file.name
+        if magic_number == b"%PDF" and file_name.endswith(".pdf"):
+            return "pdf"
+        elif magic_number == b"PK\x03\x04" and file_name.endswith(".zip"):
+            return "zip"
+        else:
+            return "unsupported"
+
+
+def file_md5(file: pathlib.Path | str) -> str:
+    md5 = hashlib.md5()
+    with open(file, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class HashCancelled(Exception):
+    pass
+
+
+def file_digests(file: pathlib.Path | str, cancel: threading.Event | None = None) -> tuple[str, str]:
+    """一次读取同时计算 MD5 和按上传分块规则得到的 S3 ETag；cancel 被设置时抛出 HashCancelled"""
+    md5 = hashlib.md5()
+    part_digests: list[bytes] = []
+    with open(file, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        multipart = size >= MULTIPART_THRESHOLD
+        while True:
+            part = hashlib.md5()
+            remaining = MULTIPART_CHUNKSIZE
+            while remaining and (chunk := f.read(min(CHUNK_SIZE, remaining))):
+                if cancel is not None and cancel.is_set():
+                    raise HashCancelled(str(file))
+                md5.update(chunk)
+                if multipart:
+                    part.update(chunk)
+                remaining -= len(chunk)
+            if remaining == MULTIPART_CHUNKSIZE:    # 已读完
+                break
+            part_digests.append(part.digest())
+    if not multipart:
+        return md5.hexdigest(), md5.hexdigest()
+    return md5.hexdigest(), f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def type_of_magic(magic_number: bytes) -> str:
+    """仅凭文件开头判断类型，用于没有文件名的数据流"""
+    if magic_number.startswith(b"%PDF"):
+        return "pdf"
+    if magic_number.startswith(b"PK\x03\x04"):
+        return "zip"
+    return "unsupported"
+
+
+class StreamDigests:
+    """
+    边读边计算 MD5，用于事先不知道大小、只能读取一次的数据流。
+    etag 为 True 时同时按上传分块计算各分块的 MD5，结束后可得到 S3 ETag。
+    """
+
+    def __init__(self, etag: bool = False):
+        self.size = 0
+        self._md5 = hashlib.md5()
+        self._parts: list[bytes] | None = [] if etag else None
+        self._part = hashlib.md5()
+        self._part_size = 0
+
+    def update(self, chunk: bytes) -> None:
+        self._md5.update(chunk)
+        self.size += len(chunk)
+        if self._parts is None:
+            return
+        view = memoryview(chunk)
+        while view:
+            piece = view[:MULTIPART_CHUNKSIZE - self._part_size]
+            self._part.update(piece)
+            self._part_size += len(piece)
+            view = view[len(piece):]
+            if self._part_size == MULTIPART_CHUNKSIZE:
+                self._parts.append(self._part.digest())
+                self._part = hashlib.md5()
+                self._part_size = 0
+
+    @property
+    def md5(self) -> str:
+        return self._md5.hexdigest()
+
+    @property
+    def etag(self) -> str:
+        if self._parts is None:
+            raise ValueError("未计算分块 MD5")
+        if self.size < MULTIPART_THRESHOLD:
+            return self.md5
+        parts = self._parts + ([self._part.digest()] if self._part_size else [])
+        return f"{hashlib.md5(b''.join(parts)).hexdigest()}-{len(parts)}"
+
+
+def format_filename(file_name: str) -> str | None:
+    """从文件名或链接中取出 `<md5>.<pdf|zip>`，格式不正确时返回 None"""
+    file_name = file_name.strip()
+    prefixs = [
+        f"{baseURL}/files/",
+        "https://byrdocs.org/files/",
+        "byrdocs.org/files/",
+        "/files/",
+        "files/",
+        "/",
+    ]
+    for pre in prefixs:
+        file_name = file_name.removeprefix(pre)
+    if file_name.endswith(".pdf"):
+        suffix = ".pdf"
+    elif file_name.endswith(".zip"):
+        suffix = ".zip"
+    else:
+        return None
+    file_name = file_name.removesuffix(suffix)
+    if len(file_name) == 32:
+        for c in file_name:
+            if c not in "0123456789abcdef":
+                return None
+        return file_name + suffix
+    return None
+
+
+@contextmanager
+def _file_lock(path: pathlib.Path):
+    if fcntl is None:
+        yield
+        return
+    with path.open("a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class HashCache:
+    """
+    以绝对路径为键缓存文件的 MD5 和类型，文件大小或修改时间变化时失效。
+    保存时持有文件锁，与文件中现有的条目合并，同时运行的多个进程不会覆盖彼此新增的条目。
+    """
+
+    def __init__(self, path: pathlib.Path = hash_cache_path):
+        self.path = path
+        self.entries: dict[str, dict] = {}
+        self._stored: dict[str, dict] = {}     # 本进程新增或更新、尚未保存的条目
+        self._lock = threading.Lock()
+        self._read()
+
+    def _read(self) -> None:
+        try:
+            with self.path.open("r") as f:
+                self.entries = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.entries = {}
+
+    def reload(self) -> None:
+        """重新读取缓存文件，得到其他进程保存的条目，本进程尚未保存的条目保留"""
+        with self._lock:
+            self._read()
+            self.entries.update(self._stored)
+
+    def lookup(self, file: pathlib.Path | str, stat: os.stat_result | None = None) -> dict | None:
+        file = os.path.abspath(file)
+        stat = stat or os.stat(file)
+        entry = self.entries.get(file)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry
+        return None
+
+    def store(self, file: pathlib.Path | str, md5: str, file_type: str, stat: os.stat_result | None = None,
+              etag: str | None = None) -> None:
+        file = os.path.abspath(file)
+        stat = stat or os.stat(file)
+        with self._lock:
+            self.entries[file] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "md5": md5,
+                "type": file_type,
+            }
+            if etag is not None:
+                self.entries[file]["etag"] = etag
+            self._stored[file] = self.entries[file]
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._stored:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with _file_lock(self.path.with_name(f"{self.path.name}.lock")):
+                self._read()
+                self.entries.update(self._stored)
+                # 先写临时文件再替换，避免中断时留下损坏的缓存
+                tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                with tmp_path.open("w") as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp_path, self.path)
+            self._stored = {}
+
+
+def fingerprint(file: pathlib.Path | str, cache: HashCache | None = None) -> str:
+    """返回文件在 BYR Docs 上的文件名 `<md5>.<pdf|zip>`，命中缓存时只需一次 stat。"""
+    stat = os.stat(file)
+    if cache is not None and (entry := cache.lookup(file, stat)) is not None:
+        return f"{entry['md5']}.{entry['type']}"
+    with trace.span("hash", file=str(file), size=stat.st_size):
+        file_type = get_file_type(file)
+        md5 = file_md5(file)
+    if cache is not None:
+        cache.store(file, md5, file_type, stat)
+    return f"{md5}.{file_type}"
+
+
+def multipart_etag(file: pathlib.Path | str, cache: HashCache | None = None) -> str:
+    """
+    返回文件以当前分块设置上传后 S3 对象应有的 ETag，用于比对服务器上的文件。
+    小于分块阈值时即为 MD5；否则为各分块 MD5 拼接后的 MD5 加上 `-<分块数>`。
+    结果连同 MD5 一起写入缓存，之后调用 fingerprint 不会再次读取文件。
+    """
+    stat = os.stat(file)
+    entry = cache.lookup(file, stat) if cache is not None else None
+    if entry is not None and entry["md5"]:
+        if stat.st_size < MULTIPART_THRESHOLD:
+            return entry["md5"]
+        if "etag" in entry:
+            return entry["etag"]
+    with trace.span("hash", file=str(file), size=stat.st_size, etag=True):
+        md5, etag = file_digests(file)
+    if cache is not None:
+        cache.store(file, md5, entry["type"] if entry is not None else get_file_type(file), stat, etag)
+    return etag
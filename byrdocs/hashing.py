@@ -0,0 +1,160 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from byrdocs import trace
+from byrdocs.fingerprint import HashCache, file_md5, get_file_type
+from byrdocs.sync import scan
+
+'''
+批量计算文件在 BYR Docs 上的文件名 `<md5>.<pdf|zip>`，不上传、不生成元信息。
+
+命中哈希缓存的文件只需一次 stat；其余文件交给进程池，每个文件用 mmap 整体交给 hashlib，
+省去逐块读入 Python 的复制。结果按输入顺序逐行输出，进程池中的任务预先全部提交，
+前面的大文件不会让后面的进程空闲。
+'''
+
+FORMATS = ("tsv", "jsonl")
+CHUNK = 8       # 每个任务计算的文件数，减少小文件的进程间通信
+
+
+def mmap_md5(file: str) -> str:
+    with open(file, "rb") as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return hashlib.md5(mapped).hexdigest()
+        except (ValueError, OSError):
+            # 空文件无法 mmap，部分文件系统也不支持，退回分块读取
+            pass
+    return file_md5(file)
+
+
+def _hash(file: str) -> tuple[str, str, str | None]:
+    """在子进程中执行，返回 (md5, 类型, 错误)；不支持的文件不读取内容，md5 为空"""
+    try:
+        with trace.span("hash", file=file):
+            file_type = get_file_type(file)
+            if file_type == "unsupported":
+                return "", file_type, None
+            return mmap_md5(file), file_type, None
+    except OSError as e:
+        # 在子进程中处理，一个文件出错不会影响同一任务中的其他文件
+        return "", "unsupported", str(e)
+
+
+def _hash_chunk(files: list[str]) -> list[tuple[str, str, str | None]]:
+    return [_hash(file) for file in files]
+
+
+def expand(paths: Iterable[str]) -> Iterator[str]:
+    """目录展开为其中的 PDF / ZIP 文件，直接指定的文件原样保留"""
+    for path in paths:
+        if os.path.isdir(path):
+            yield from sorted(file for file, _ in scan(path))
+        else:
+            yield os.path.abspath(path)
+
+
+def hash_files(files: list[str], cache: HashCache, workers: int | None = None) -> Iterator[tuple[str, dict]]:
+    """
+    依次产生 (路径, 结果)，结果为 {"key", "md5", "type", "size"} 或 {"error"}。
+    缓存未命中的文件在进程池中计算，算完后写入缓存。
+    """
+    stats: list[os.stat_result | None] = []
+    pending: dict[str, None] = {}   # 同一路径可能被指定多次，只计算一次
+    for file in files:
+        try:
+            stat = os.stat(file)
+        except OSError:
+            stat = None
+        stats.append(stat)
+        if stat is not None and cache.lookup(file, stat) is None:
+            pending[file] = None
+
+    executor = ProcessPoolExecutor(max_workers=workers)
+    names = list(pending)
+    # 不使用 executor.map：提前停止时需要逐个取消尚未开始的任务（shutdown 的 cancel_futures 需要 3.9）
+    futures = [executor.submit(_hash_chunk, names[i:i + CHUNK]) for i in range(0, len(names), CHUNK)]
+    try:
+        computed = zip(names, (result for future in futures for result in future.result()))
+        results: dict[str, tuple[str, str, str | None]] = {}
+        for file, stat in zip(files, stats):
+            if stat is None:
+                yield file, {"error": "文件不存在或无法读取"}
+                continue
+            if (entry := cache.lookup(file, stat)) is not None:
+                md5, file_type = entry["md5"], entry["type"]
+            else:
+                # 按路径取结果：同一路径第二次出现时已命中缓存，结果与文件不能按位置对应
+                while file not in results:
+                    done, result = next(computed)
+                    results[done] = result
+                md5, file_type, message = results[file]
+                if message is not None:
+                    yield file, {"error": message}
+                    continue
+                cache.store(file, md5, file_type, stat)
+            if file_type == "unsupported":
+                yield file, {"error": "不是 PDF 或 ZIP 文件"}
+            else:
+                yield file, {"key": f"{md5}.{file_type}", "md5": md5, "type": file_type, "size": stat.st_size}
+    finally:
+        # 调用方提前停止迭代（如输出管道被关闭）时，不再等待尚未开始的任务
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def run(paths: list[str], output_format: str = "tsv", workers: int | None = None) -> int:
+    """输出每个文件的结果，返回失败的文件数"""
+    from byrdocs.resources import warn
+
+    cache = HashCache()
+    failed = 0
+    try:
+        for file, result in hash_files(list(expand(paths)), cache, workers):
+            if "error" in result:
+                failed += 1
+                print(warn(f"{file}: {result['error']}"), file=sys.stderr)
+            elif output_format == "jsonl":
+                print(json.dumps({"path": file, **result}, ensure_ascii=False), flush=True)
+            else:
+                print(f"{result['key']}\t{result['size']}\t{file}", flush=True)
+    except BrokenPipeError:
+        # 输出被 head 等提前关闭，已算出的结果仍写入缓存
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        cache.save()
+    return failed
+
+
+class Tests:
+    def test_duplicate_paths(self):
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as directory:
+            files = []
+            for name in ("a", "b", "c"):
+                file = os.path.join(directory, f"{name}.pdf")
+                with open(file, "wb") as f:
+                    f.write(b"%PDF-" + name.encode())
+                files.append(file)
+            cache = HashCache(Path(directory) / "cache.json")
+            results = list(hash_files([files[0], files[0], files[1], files[2]], cache, workers=2))
+            assert [file for file, _ in results] == [files[0], files[0], files[1], files[2]]
+            for file, result in results:
+                assert result["md5"] == file_md5(file)
+                assert cache.lookup(file)["md5"] == result["md5"]
+
+
+if __name__ == "__main__":
+    tests = Tests()
+    tests.test_duplicate_paths()
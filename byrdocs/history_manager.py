@@ -1,7 +1,37 @@
 import json
+import os
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 
+from byrdocs import trace
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
 history_path = Path.home() / ".config" / "byrdocs" / "history.json"
+lock_path = history_path.with_name("history.lock")
+
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def _history_lock():
+    # 线程锁保护同一进程内的并发上传，文件锁保护同时运行的多个 byrdocs 进程
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        if not lock_path.parent.exists():
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with lock_path.open("a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
 
 '''
 File format:
@@ -37,9 +67,13 @@ class UploadHistory:
         self.courses: list[str] = []
         if history_path.exists():
             self._read()
-        else:
-            self._create_history_file()
-        self._write()
+            return
+        with _history_lock():
+            # 加锁后再检查一次，其他进程可能刚创建并写入了历史文件
+            if history_path.exists():
+                self._read()
+            else:
+                self._create_history_file()
     
     def _read(self) -> None:
         try:
@@ -54,16 +88,20 @@ class UploadHistory:
     def _write(self):
         self.data["history"] = self.history
         self.data["courses"] = self.courses
-        with history_path.open("w") as f:
+        # 先写临时文件再替换，其他进程不会读到写了一半的文件
+        tmp_path = history_path.with_name(f"{history_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_path.open("w") as f:
             json.dump(self.data, f, indent=4)
+        os.replace(tmp_path, history_path)
     
     def _with_update(func):
         def wrapper(self, *args, **kwargs):
-            self._read()
-            result = func(self, *args, **kwargs)
-            self.data["history"] = self.history
-            self.data["courses"] = self.courses
-            self._write()
+            with trace.span("history", op=func.__name__), _history_lock():
+                self._read()
+                result = func(self, *args, **kwargs)
+                self.data["history"] = self.history
+                self.data["courses"] = self.courses
+                self._write()
             return result
         return wrapper
 
@@ -78,6 +116,14 @@ class UploadHistory:
     @_with_update
     def add_course(self, course: str):
         self.courses.append(course)
+
+    @_with_update
+    def add_course_once(self, course: str) -> bool:
+        """课程不在记录中时才添加，检查和添加在同一次加锁中完成，返回是否添加"""
+        if course in self.courses:
+            return False
+        self.courses.append(course)
+        return True
         
     @_with_update  
     def get(self) -> list[dict[str, str]]:
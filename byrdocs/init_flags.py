@@ -0,0 +1,244 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+
+import yaml
+
+from byrdocs import pdf_info, validators as v
+from byrdocs.fingerprint import HashCache, fingerprint, format_filename, get_file_type
+from byrdocs.history_manager import UploadHistory
+from byrdocs.resources import error
+
+'''
+根据命令行参数生成元信息文件，不经过交互界面：
+
+    byrdocs init <文件|md5|链接> --type test --course "高等数学A（上）" --year 2023-2024 --stage 期末 --content 原题
+
+不导入 InquirerPy 和 prompt_toolkit，不需要终端。字段的校验和规范化与交互式录入共用 validators，
+每次调用只使用局部变量，元信息文件先写入临时文件再替换，课程记录和哈希缓存在文件锁内读取、合并后写回，
+可以用 `xargs -P` 同时运行多个。
+'''
+
+SEMESTERS = {"first": "First", "1": "First", "第一学期": "First", "second": "Second", "2": "Second", "第二学期": "Second"}
+
+
+class MetadataError(ValueError):
+    pass
+
+
+def new_metadata(file_name: str, type: str = "", data: dict | None = None) -> dict:
+    """file_name 为 `<md5>.<pdf|zip>`"""
+    return {"id": file_name[:-4], "url": f"https://byrdocs.org/files/{file_name}", "type": type,
+            "data": data if data is not None else {}}
+
+
+def render_metadata(metadata: dict) -> str:
+    yaml_content = f"# yaml-language-server: $schema=https://byrdocs.org/schema/{metadata['type']}.yaml\n\n"
+    yaml_content += yaml.dump(metadata, indent=2, sort_keys=False, allow_unicode=True)
+    return yaml_content
+
+
+def save_metadata(metadata: dict, directory: str = ".") -> str:
+    """写入 <directory>/<md5>.yml 并返回路径；同一文件被同时写入时，读者只会看到完整的某一份"""
+    path = os.path.join(directory, f"{metadata['id']}.yml")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render_metadata(metadata))
+    os.replace(tmp_path, path)
+    return path
+
+
+def resolve_target(target: str) -> tuple[str, str | None]:
+    """返回 (`<md5>.<pdf|zip>`, 本地文件路径)；target 可以是本地文件、文件名、链接或上传历史中的 MD5"""
+    if os.path.isfile(target):
+        if get_file_type(target) == "unsupported":
+            raise MetadataError("不支持的文件格式，仅支持 PDF 或 ZIP 文件")
+        cache = HashCache()
+        file_name = fingerprint(target, cache)
+        cache.save()
+        return file_name, target
+    if (file_name := format_filename(target)) is not None:
+        return file_name, None
+    if re.fullmatch(r"[0-9a-f]{32}", target.strip()):
+        for line in UploadHistory().get():
+            if line["md5"][:32] == target.strip():
+                return line["md5"], None
+        raise MetadataError("上传历史中没有该 MD5，请使用 <md5>.pdf 或 <md5>.zip")
+    raise MetadataError("既不是本地文件，也不是 <md5>.pdf、<md5>.zip 或文件链接")
+
+
+def _required(value: str | None, flag: str) -> str:
+    if value is None or not v.not_empty(value):
+        raise MetadataError(f"缺少 {flag}")
+    return value.strip()
+
+
+def _list(values: list[str] | None) -> list[str]:
+    # 参数可以重复指定，去掉重复和空白的项
+    return [value for value in v.to_clear_list("\n".join(values or [])) if value]
+
+
+def _contents(values: list[str] | None, allowed: tuple[str, ...]) -> list[str]:
+    contents = _list(values)
+    if not v.not_empty(contents):
+        raise MetadataError(f"缺少 --content，可选 {'、'.join(allowed)}")
+    for content in contents:
+        if content not in allowed:
+            raise MetadataError(f"--content 只能是 {'、'.join(allowed)}，而不是 {content}")
+    return contents
+
+
+def _course_type(value: str | None) -> str | None:
+    if value is not None and value not in v.COURSE_TYPES:
+        raise MetadataError(f"--course-type 只能是 {'、'.join(v.COURSE_TYPES)}")
+    return value
+
+
+def _book(file_name: str, args: argparse.Namespace, prefill: dict) -> dict:
+    title = _required(args.title or prefill["title"], "--title")
+    if not v.not_empty(authors := _list(args.author or prefill["authors"])):
+        raise MetadataError("缺少 --author")
+    data = {"title": title, "authors": authors}
+    if v.not_empty(translators := _list(args.translator)):
+        data["translators"] = translators
+    if args.edition is not None and v.not_empty(args.edition):
+        if (edition := v.to_vaild_edition(args.edition)) is None:
+            raise MetadataError(f"无效的版次: {args.edition}")
+        data["edition"] = edition
+    if args.publisher is not None and v.not_empty(args.publisher):
+        data["publisher"] = args.publisher.strip()
+    if args.publish_year is not None and v.not_empty(args.publish_year):
+        if not v.is_vaild_year(args.publish_year.strip()):
+            raise MetadataError(f"无效的出版年份: {args.publish_year}")
+        data["publish_year"] = args.publish_year.strip()
+    if not args.isbn or (isbn := v.to_isbn13("\n".join(args.isbn))) is None:
+        raise MetadataError("缺少 --isbn 或 ISBN 无效，需要至少一个有效的 ISBN-10 或 ISBN-13")
+    data["isbn"] = isbn
+    data["filetype"] = file_name[-3:]
+    return data
+
+
+def _test(file_name: str, args: argparse.Namespace) -> dict:
+    data = {}
+    if v.not_empty(colleges := _list(args.college)):
+        if not v.college_validate("\n".join(colleges)):
+            raise MetadataError(f"无效的学院，应为以下之一: {'、'.join(v.colleges)}")
+        data["college"] = colleges
+    data["course"] = {}
+    if (course_type := _course_type(args.course_type)) is not None:
+        data["course"]["type"] = course_type
+    data["course"]["name"] = _required(args.course, "--course")
+
+    start, _, end = _required(args.year, "--year").partition("-")
+    start, end = start.strip(), (end or start).strip()     # 只能精确到某一年时开始和结束相同
+    if not v.is_vaild_year(start) or not v.valid_year_period(start, end):
+        raise MetadataError(f"无效的学年: {args.year}，应为 2023-2024 或 2023")
+    data["time"] = {"start": start, "end": end}
+    if args.semester is not None:
+        if (semester := SEMESTERS.get(args.semester.strip().lower())) is None:
+            raise MetadataError("--semester 只能是 First 或 Second（也可写作 1、2）")
+        data["time"]["semester"] = semester
+    if args.stage is not None:
+        if args.stage not in v.STAGES:
+            raise MetadataError(f"--stage 只能是 {'、'.join(v.STAGES)}")
+        data["time"]["stage"] = args.stage
+    data["filetype"] = file_name[-3:]
+    data["content"] = _contents(args.content, v.TEST_CONTENTS)
+    return data
+
+
+def _doc(file_name: str, args: argparse.Namespace, prefill: dict) -> dict:
+    data = {
+        "title": _required(args.title or prefill["title"], "--title"),
+        "filetype": file_name[-3:],
+        "course": [{}],
+        "content": _contents(args.content, v.DOC_CONTENTS),
+    }
+    if (course_type := _course_type(args.course_type)) is not None:
+        data["course"][0]["type"] = course_type
+    data["course"][0]["name"] = _required(args.course, "--course")
+    return data
+
+
+def build_metadata(file_name: str, args: argparse.Namespace, file_path: str | None = None) -> dict:
+    """按参数生成元信息，参数缺失或无效时抛出 MetadataError"""
+    if args.type not in v.TYPES:
+        raise MetadataError(f"--type 只能是 {'、'.join(v.TYPES)}")
+    # 与交互式录入相同，指定了本地 PDF 时用内嵌的标题和作者补全未指定的参数
+    prefill = {"title": None, "authors": []}
+    if file_path is not None and file_name.endswith(".pdf") and args.type in ("book", "doc") \
+            and (args.title is None or (args.type == "book" and not args.author)):
+        prefill = pdf_info.extract(file_path)
+    if args.type == "book":
+        data = _book(file_name, args, prefill)
+    elif args.type == "test":
+        data = _test(file_name, args)
+    else:
+        data = _doc(file_name, args, prefill)
+    return new_metadata(file_name, args.type, data)
+
+
+def run(args: argparse.Namespace) -> int:
+    """写入成功时输出文件路径并返回 0，否则在标准错误中输出原因并返回 1"""
+    if not args.file:
+        print(error("错误：未指定文件、MD5 或链接"), file=sys.stderr)
+        return 1
+    directory = args.output or "."
+    try:
+        file_name, file_path = resolve_target(args.file)
+        metadata = build_metadata(file_name, args, file_path)
+        if os.path.exists(os.path.join(directory, f"{file_name[:-4]}.yml")) and not args.force:
+            raise MetadataError(f"{file_name[:-4]}.yml 已存在，使用 --force 覆盖")
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        path = save_metadata(metadata, directory)
+    except (MetadataError, OSError) as e:
+        print(error(f"{args.file}: {e}"), file=sys.stderr)
+        return 1
+    if metadata["type"] == "test":
+        # 与交互式录入相同，记录课程名用于补全；已有时不再重复写入
+        UploadHistory().add_course_once(metadata["data"]["course"]["name"])
+    print(path)
+    return 0
+
+
+class Tests:
+    def test_concurrent_runs(self):
+        # 与 `xargs -P` 相同，同时启动多个进程，检查课程记录和哈希缓存没有重复或丢失
+        import json
+        import subprocess
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as home:
+            env = dict(os.environ, HOME=home)
+            env.pop("BYRDOCS_TRACE", None)
+            files = []
+            for i in range(16):
+                files.append(os.path.join(home, f"{i}.pdf"))
+                with open(files[-1], "wb") as f:
+                    f.write(b"%PDF-" + str(i).encode())
+            processes = [
+                subprocess.Popen(
+                    [sys.executable, "-c", "import byrdocs; byrdocs.main()", "init", file, "--type", "test",
+                     "--course", "高等数学A（上）" if i % 2 else f"课程{i}", "--year", "2023-2024",
+                     "--content", "原题", "-o", os.path.join(home, "out")],
+                    env=env, stdout=subprocess.DEVNULL)
+                for i, file in enumerate(files)
+            ]
+            assert all(process.wait() == 0 for process in processes)
+            assert len(os.listdir(os.path.join(home, "out"))) == len(files)
+            config = os.path.join(home, ".config", "byrdocs")
+            with open(os.path.join(config, "history.json")) as f:
+                courses = json.load(f)["courses"]
+            assert sorted(courses) == sorted({"高等数学A（上）"} | {f"课程{i}" for i in range(0, 16, 2)})
+            with open(os.path.join(config, "hash_cache.json")) as f:
+                assert set(json.load(f)) == set(files)
+
+
+if __name__ == "__main__":
+    tests = Tests()
+    tests.test_concurrent_runs()
@@ -2,13 +2,15 @@ from InquirerPy import inquirer
 from InquirerPy.base.control import Choice
 from InquirerPy.validator import PathValidator
 from byrdocs.resources import title
-from byrdocs.custom_prompt import FilePathCompleter, ThreadedCompleter
+from byrdocs.custom_prompt import FilePathCompleter, FilePathPrompt, ThreadedCompleter
+from byrdocs.prefetch import Prefetch, Prefetcher
 from pathlib import Path
 
 class Command:
-    def __init__(self, command: str, file: str = None):
+    def __init__(self, command: str, file: str = None, prefetch: Prefetch = None):
         self.command = command
         self.file = file
+        self.prefetch = prefetch    # 输入路径时在后台预先计算的哈希和存在性检查
         
 def remove_quotes(file_path) -> Path:
     return Path(file_path.strip().strip("'").strip('"'))  # 终端拖入时可能含有引号
@@ -36,15 +38,21 @@ def main_menu() -> Command:
     ).execute()
     
     if command == "upload_2":
-        file_path = inquirer.text(
+        prefetcher = Prefetcher()
+        prompt = FilePathPrompt(
             message="选择上传的文件路径",
             long_instruction="支持拖拽文件到终端。或直接输入，Tab 补全，Enter 确定。",
             validate=is_valid_file,
             completer=ThreadedCompleter(FilePathCompleter()),
             invalid_message="请输入正确的文件路径",
+            on_change=lambda text: prefetcher.update(str(remove_quotes(text).expanduser().absolute())),
+            status=lambda: "⚠ 该文件已上传过" if prefetcher.exists() else "",
             # only_files=False
-        ).execute()
-        return Command(command, remove_quotes(file_path).expanduser().absolute())
+        )
+        prefetcher.on_update = prompt.refresh
+        file_path = prompt.execute()
+        file = remove_quotes(file_path).expanduser().absolute()
+        return Command(command, file, prefetcher.take(str(file)))
     
     if command == "exit":
         exit(0)
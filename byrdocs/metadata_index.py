@@ -0,0 +1,266 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+from byrdocs.config import config_dir, ensure_config_dir
+from byrdocs.history_manager import history_path
+
+'''
+元信息文件 (`<md5>.yml`) 和上传历史的本地索引，保存在 SQLite 中。
+
+每个 yml 文件按 (大小, 修改时间) 记录，刷新时只需 stat，只有新增或修改过的文件才会重新解析；
+上传历史在 history.json 的修改时间变化时整体重建。查询使用索引列和预先规范化的全文字段，
+数万条记录也能在毫秒级返回。
+'''
+
+index_path = config_dir / "metadata_index.sqlite3"
+
+PARALLEL_THRESHOLD = 64     # 需要解析的文件较多时才启动进程池
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    path TEXT PRIMARY KEY,
+    dir TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    id TEXT,
+    type TEXT,
+    title TEXT,
+    title_key TEXT,
+    course TEXT,
+    stage TEXT,
+    time TEXT,
+    filetype TEXT,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS docs_dir ON docs (dir);
+CREATE INDEX IF NOT EXISTS docs_id ON docs (id);
+CREATE TABLE IF NOT EXISTS history (
+    id TEXT PRIMARY KEY,
+    key TEXT NOT NULL,
+    file TEXT,
+    file_key TEXT,
+    timestamp REAL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+# `字段:值` 形式的查询条件对应的列（SQLite 的 LIKE 对 ASCII 字母不区分大小写）
+FIELDS = {
+    "type": "type",
+    "title": "title_key",
+    "course": "course",
+    "stage": "stage",
+    "time": "time",
+    "year": "time",
+    "filetype": "filetype",
+}
+
+
+def normalize(text: str) -> str:
+    # NFKC 把全角括号、字母等转为半角，“高等数学A（上）”与“高等数学a(上)”可以互相匹配
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def _flatten(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, dict):
+        return [text for item in value.values() for text in _flatten(item)]
+    if isinstance(value, list):
+        return [text for item in value for text in _flatten(item)]
+    return [str(value)]
+
+
+def _courses(data: dict) -> list[str]:
+    course = data.get("course")
+    if isinstance(course, dict):    # test
+        course = [course]
+    return [item["name"] for item in course or [] if isinstance(item, dict) and item.get("name")]
+
+
+def parse(path: str) -> tuple | None:
+    """解析一个元信息文件，返回 docs 表中除 path/dir/size/mtime_ns 外的各列"""
+    import yaml
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)  # 有 libyaml 时快一个数量级
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            metadata = yaml.load(f, Loader=loader)
+    except (OSError, UnicodeDecodeError, yaml.YAMLError):
+        return None
+    if not isinstance(metadata, dict) or not isinstance(metadata.get("data"), dict):
+        return None
+    data = metadata["data"]
+    courses = _courses(data)
+    time = data.get("time") if isinstance(data.get("time"), dict) else {}
+    title = data.get("title") or " ".join(courses)
+    years = "-".join(str(time[key]) for key in ("start", "end") if time.get(key))
+    if years and time.get("semester"):
+        years += f" {'第一学期' if time['semester'] == 'First' else '第二学期'}"
+    text = " ".join([os.path.basename(path)] + _flatten(metadata))
+    return (
+        str(metadata.get("id", "")),
+        str(metadata.get("type", "")),
+        str(title),
+        normalize(str(title)),
+        normalize(" ".join(courses)),
+        str(time.get("stage", "")),
+        years,
+        str(data.get("filetype", "")),
+        normalize(text),
+    )
+
+
+def _pattern(term: str) -> str:
+    escaped = normalize(term).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _parse_all(paths: list[str], workers: int | None) -> list[tuple | None]:
+    if len(paths) < PARALLEL_THRESHOLD:
+        return [parse(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(parse, paths, chunksize=32))
+
+
+class MetadataIndex:
+    def __init__(self, path=index_path):
+        ensure_config_dir()
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self) -> MetadataIndex:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.db.close()
+
+    def directories(self) -> list[str]:
+        return [row[0] for row in self.db.execute("SELECT DISTINCT dir FROM docs")]
+
+    def refresh_directory(self, directory: str, workers: int | None = None) -> int:
+        """同步目录中的 yml 文件，返回重新解析的文件数"""
+        directory = os.path.abspath(directory)
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in
+                 self.db.execute("SELECT path, size, mtime_ns FROM docs WHERE dir = ?", (directory,))}
+        changed: list[tuple[str, os.stat_result]] = []
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(".yml") or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    if known.pop(entry.path, None) != (stat.st_size, stat.st_mtime_ns):
+                        changed.append((entry.path, stat))
+        except FileNotFoundError:
+            pass
+        rows = []
+        for (path, stat), columns in zip(changed, _parse_all([path for path, _ in changed], workers)):
+            if columns is None:     # 不是元信息文件，同样记录下来，未修改前不再解析
+                columns = (None,) * 9
+            rows.append((path, directory, stat.st_size, stat.st_mtime_ns) + columns)
+        with self.db:
+            # known 中剩下的是已被删除的文件
+            self.db.executemany("DELETE FROM docs WHERE path = ?", ((path,) for path in known))
+            self.db.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def refresh_history(self) -> None:
+        try:
+            mtime_ns = os.stat(history_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = 0
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'history_mtime_ns'").fetchone()
+        if row is not None and row[0] == mtime_ns:
+            return
+        # 直接读取文件：UploadHistory 的每次调用都会重写文件并改变修改时间
+        try:
+            with history_path.open("r") as f:
+                history = json.load(f).get("history", [])
+        except (FileNotFoundError, json.JSONDecodeError):
+            history = []
+        rows = {}
+        for item in history:
+            key = item.get("md5", "")
+            try:
+                timestamp = float(item.get("timestamp", 0))
+            except ValueError:
+                timestamp = 0
+            file = item.get("file") or ""
+            rows[key.rsplit(".", 1)[0]] = (key, file, normalize(file), timestamp)    # 重复上传时保留最后一次
+        with self.db:
+            self.db.execute("DELETE FROM history")
+            self.db.executemany("INSERT INTO history VALUES (?, ?, ?, ?, ?)",
+                                ((id, *values) for id, values in rows.items()))
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('history_mtime_ns', ?)", (mtime_ns,))
+
+    def refresh(self, directories: list[str] = (), workers: int | None = None) -> None:
+        """刷新上传历史、给定目录以及之前索引过且仍存在的目录"""
+        self.refresh_history()
+        targets = {os.path.abspath(directory) for directory in directories}
+        targets.update(directory for directory in self.directories() if os.path.isdir(directory))
+        for directory in sorted(targets):
+            self.refresh_directory(directory, workers)
+        with self.db:   # 已删除的目录
+            self.db.executemany("DELETE FROM docs WHERE dir = ?",
+                                ((directory,) for directory in self.directories() if not os.path.isdir(directory)))
+
+    def known_ids(self) -> set[str]:
+        """上传历史和元信息文件中出现过的 md5，即已在 BYR Docs 上的文件"""
+        return {row[0] for row in self.db.execute(
+            "SELECT id FROM history UNION SELECT id FROM docs WHERE id IS NOT NULL")}
+
+    def search(self, query: str, limit: int | None = None) -> list[dict]:
+        """
+        空格分隔的多个关键词需同时匹配，`字段:值` 只在对应字段中匹配，例如
+        `高等数学A（上） stage:期末 type:test`。原文件名（来自上传历史）同样可以搜索。
+        """
+        conditions, params = [], []
+        for term in query.split():
+            field, _, value = term.partition(":")
+            if value and field.lower() in FIELDS:
+                conditions.append(f"docs.{FIELDS[field.lower()]} LIKE ? ESCAPE '\\'")
+                params.append(_pattern(value))
+            else:
+                conditions.append("(docs.text LIKE ? ESCAPE '\\' OR history.file_key LIKE ? ESCAPE '\\')")
+                params += [_pattern(term)] * 2
+        sql = ("SELECT docs.path, docs.id, docs.type, docs.title, docs.stage, docs.time, docs.filetype, history.file "
+               "FROM docs LEFT JOIN history ON history.id = docs.id WHERE docs.id IS NOT NULL")
+        for condition in conditions:
+            sql += f" AND {condition}"
+        sql += " ORDER BY docs.type, docs.title, docs.time"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        columns = ("path", "id", "type", "title", "stage", "time", "filetype", "file")
+        return [dict(zip(columns, row)) for row in self.db.execute(sql, params)]
+
+    def missing(self, directory: str | None = None) -> list[dict]:
+        """上传历史中还没有元信息文件的记录，指定目录时只在该目录中查找元信息文件"""
+        sql = "SELECT key, file, timestamp FROM history WHERE NOT EXISTS (SELECT 1 FROM docs WHERE docs.id = history.id"
+        params = []
+        if directory is not None:
+            sql += " AND docs.dir = ?"
+            params.append(os.path.abspath(directory))
+        sql += ") ORDER BY timestamp DESC"
+        return [dict(zip(("key", "file", "timestamp"), row)) for row in self.db.execute(sql, params)]
+
+
+TYPE_NAMES = {"book": "书籍", "test": "试题", "doc": "资料"}
+
+
+def print_results(results: list[dict]) -> None:
+    from byrdocs.resources import info, quote
+
+    for result in results:
+        details = " ".join(item for item in (result["time"], result["stage"]) if item)
+        print(info(f"[{TYPE_NAMES.get(result['type'], result['type'])}] {result['title']}")
+              + (f"  {details}" if details else ""))
+        print(quote(f"\t{result['id']}.{result['filetype']}  {result['file'] or ''}  {result['path']}"))
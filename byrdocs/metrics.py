@@ -0,0 +1,219 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import math
+import os
+import struct
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from byrdocs.config import config_dir, ensure_config_dir, MB
+
+'''
+本地记录每次上传的耗时和速度，供 `byrdocs stats` 分析。
+
+每条记录是定长的二进制结构（RECORD，RECORD.size 即 38 字节），以 O_APPEND 一次 write 追加到 metrics.bin，
+上传路径上的开销只有打开文件和一次写入。文件超过 2 * MAX_RECORDS 条时只保留最近的 MAX_RECORDS 条。
+'''
+
+metrics_path = config_dir / "metrics.bin"
+
+MAX_RECORDS = 5000
+
+# 时间戳, 大小, 哈希/握手/传输耗时, 重试次数, 分块大小, 并发数, 状态, 来源
+RECORD = struct.Struct("<dQfffHIHBB")
+
+STATUSES = ("uploaded", "skipped", "failed", "exists")
+SOURCES = ("upload", "daemon", "sync", "watch", "queue", "stdin", "pack")
+
+
+class UploadRecord:
+    __slots__ = ("timestamp", "size", "hash_seconds", "handshake_seconds", "transfer_seconds",
+                 "retries", "part_size", "concurrency", "status", "source")
+
+    def __init__(self, source: str = "upload", size: int = 0):
+        self.timestamp = time.time()
+        self.size = size
+        self.hash_seconds = 0.0
+        self.handshake_seconds = 0.0
+        self.transfer_seconds = 0.0
+        self.retries = 0
+        self.part_size = 0
+        self.concurrency = 0
+        self.status = "uploaded"
+        self.source = source
+
+    @contextmanager
+    def phase(self, name: str):
+        """累计一个阶段（hash / handshake / transfer）的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            attr = f"{name}_seconds"
+            setattr(self, attr, getattr(self, attr) + time.perf_counter() - start)
+
+    @property
+    def throughput(self) -> float | None:
+        """传输速度，单位 MB/s"""
+        if self.status != "uploaded" or self.transfer_seconds <= 0 or self.size == 0:
+            return None
+        return self.size / MB / self.transfer_seconds
+
+    def pack(self) -> bytes:
+        return RECORD.pack(self.timestamp, self.size, self.hash_seconds, self.handshake_seconds,
+                           self.transfer_seconds, min(self.retries, 0xFFFF), self.part_size,
+                           min(self.concurrency, 0xFFFF), STATUSES.index(self.status), SOURCES.index(self.source))
+
+    @classmethod
+    def unpack(cls, data: bytes) -> UploadRecord:
+        record = cls.__new__(cls)
+        (record.timestamp, record.size, record.hash_seconds, record.handshake_seconds, record.transfer_seconds,
+         record.retries, record.part_size, record.concurrency, status, source) = RECORD.unpack(data)
+        record.status = STATUSES[status] if status < len(STATUSES) else "failed"
+        record.source = SOURCES[source] if source < len(SOURCES) else "upload"
+        return record
+
+
+def save(record: UploadRecord) -> None:
+    """追加一条记录；统计数据出错不应影响上传，因此忽略 OSError"""
+    try:
+        ensure_config_dir()
+        fd = os.open(metrics_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, record.pack())
+            size = os.fstat(fd).st_size
+        finally:
+            os.close(fd)
+        if size >= 2 * MAX_RECORDS * RECORD.size:
+            _compact()
+    except OSError:
+        pass
+
+
+def _compact() -> None:
+    # 与其他进程的追加同时发生时可能丢失一两条记录，对统计没有影响
+    with open(metrics_path, "rb") as f:
+        f.seek(-MAX_RECORDS * RECORD.size, os.SEEK_END)
+        data = f.read()
+    tmp_path = metrics_path.with_name(f"{metrics_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, metrics_path)
+
+
+def load() -> list[UploadRecord]:
+    try:
+        with open(metrics_path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    data = data[:len(data) - len(data) % RECORD.size]
+    return [UploadRecord.unpack(data[i:i + RECORD.size]) for i in range(0, len(data), RECORD.size)]
+
+
+def percentile(values: list[float], p: float) -> float:
+    """最近秩法，values 需已排序"""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _bar(value: float, maximum: float, width: int = 30) -> str:
+    return "█" * max(1 if value else 0, round(value / maximum * width)) if maximum else ""
+
+
+def report(weeks: int = 8) -> None:
+    from byrdocs.config import MULTIPART_THRESHOLD
+    from byrdocs.resources import info, warn, quote, format_size
+
+    records = load()
+    if not records:
+        print(warn("还没有上传记录"))
+        return
+    uploaded = [record for record in records if record.status == "uploaded"]
+    failed = sum(record.status == "failed" for record in records)
+    print(info(f"共 {len(records)} 次上传，成功 {len(uploaded)} 次，失败 {failed} 次，"
+               f"上传 {format_size(sum(record.size for record in uploaded))}"))
+
+    speeds = sorted(speed for record in records if (speed := record.throughput) is not None)
+    if speeds:
+        print("\n" + info("传输速度 (MB/s)"))
+        print("\t" + "  ".join(f"p{p}: {percentile(speeds, p):.2f}" for p in (10, 50, 90, 99)))
+
+        # 以 2 的幂为边界的速度分布
+        buckets: dict[int, int] = defaultdict(int)
+        for speed in speeds:
+            buckets[math.floor(math.log2(max(speed, 1 / 16)))] += 1
+        largest = max(buckets.values())
+        for exponent in range(min(buckets), max(buckets) + 1):
+            label = f"{2 ** exponent:g}-{2 ** (exponent + 1):g}"
+            print(quote(f"\t{label:>11}  {buckets[exponent]:>5}  ") + _bar(buckets[exponent], largest))
+
+        # 按周统计速度中位数，观察是否越来越慢
+        by_week: dict[int, list[float]] = defaultdict(list)
+        now = time.time()
+        for record in uploaded:
+            if (speed := record.throughput) is not None and (week := int((now - record.timestamp) // (7 * 86400))) < weeks:
+                by_week[week].append(speed)
+        if by_week:
+            print("\n" + info("每周传输速度中位数 (MB/s)"))
+            fastest = max(percentile(sorted(values), 50) for values in by_week.values())
+            for week in range(weeks - 1, -1, -1):
+                values = sorted(by_week.get(week, []))
+                label = "本周" if week == 0 else f"{week} 周前"
+                median = percentile(values, 50) if values else 0
+                print(quote(f"\t{label:>6}  {median:>7.2f}  ({len(values):>3} 次)  ") + _bar(median, fastest))
+
+    if uploaded:
+        print("\n" + info("各阶段耗时中位数 (秒)"))
+        for phase, name in (("hash", "计算哈希"), ("handshake", "申请上传"), ("transfer", "传输")):
+            values = sorted(getattr(record, f"{phase}_seconds") for record in uploaded)
+            print(f"\t{name}: {percentile(values, 50):.3f}  p90: {percentile(values, 90):.3f}")
+        with_retries = sum(record.retries > 0 for record in uploaded)
+        print(f"\t发生重试的上传: {with_retries} 次，共重试 {sum(record.retries for record in uploaded)} 次")
+
+    suggestions = _suggest(records, MULTIPART_THRESHOLD)
+    if suggestions:
+        print("\n" + info("建议"))
+        for suggestion in suggestions:
+            print(f"\t- {suggestion}")
+
+
+def _suggest(records: list[UploadRecord], multipart_threshold: int) -> list[str]:
+    uploaded = [record for record in records if record.status == "uploaded"]
+    suggestions = []
+    if not uploaded:
+        return suggestions
+
+    # 小文件的耗时主要在握手上时，守护进程可以省去启动和握手前的准备
+    small = [record for record in uploaded if record.size < 10 * MB and record.source != "daemon"]
+    if len(small) >= 5:
+        handshake = percentile(sorted(record.handshake_seconds for record in small), 50)
+        transfer = percentile(sorted(record.transfer_seconds for record in small), 50)
+        if handshake > transfer:
+            suggestions.append(f"小文件上传中申请上传的时间（{handshake:.2f}s）超过了传输时间，"
+                               "批量上传时可以先运行 `byrdocs daemon`，或使用 `byrdocs sync` 一次上传整个目录")
+
+    # 比较不同并发数下批量上传的总吞吐
+    by_concurrency: dict[int, list[UploadRecord]] = defaultdict(list)
+    for record in uploaded:
+        if record.source in ("sync", "watch", "queue") and record.concurrency:
+            by_concurrency[record.concurrency].append(record)
+    rates = {}
+    for concurrency, group in by_concurrency.items():
+        speeds = sorted(speed for record in group if (speed := record.throughput) is not None)
+        if len(speeds) >= 5:
+            rates[concurrency] = percentile(speeds, 50) * concurrency
+    if len(rates) >= 2:
+        best = max(rates, key=rates.get)
+        suggestions.append(f"批量上传时 --workers {best} 的总吞吐最高（约 {rates[best]:.1f} MB/s）")
+
+    large = [record for record in uploaded if record.size >= multipart_threshold]
+    if len(large) >= 3 and sum(record.retries for record in large) / len(large) >= 1:
+        suggestions.append("大文件分块上传时经常重试，网络不稳定，建议减少并发或改用 `byrdocs queue` 在网络较好时上传")
+
+    hashing = sorted(record.hash_seconds for record in uploaded)
+    if percentile(hashing, 50) > 1 and percentile(hashing, 50) > percentile(
+            sorted(record.transfer_seconds for record in uploaded), 50):
+        suggestions.append("计算哈希的时间超过了传输时间，重复上传同一目录时请使用 `byrdocs sync`，哈希结果会被缓存")
+    return suggestions
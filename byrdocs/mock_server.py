@@ -0,0 +1,468 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+'''
+本地模拟 BYR Docs 的 API 和 S3 服务，可以注入延迟、限速、断开连接和 5xx 错误，
+用于在没有网络的情况下测试重试、续传和超时的处理，以及在恶劣网络下的尾延迟。
+
+    $ python -m byrdocs.mock_server --port 8000 --latency 0.2 --bandwidth 2M --error-rate 0.05
+    $ export BYRDOCS_BASE_URL=http://127.0.0.1:8000 BYRDOCS_S3_ENDPOINT=http://127.0.0.1:8000
+    $ byrdocs login && byrdocs upload a.pdf
+
+支持的接口:
+    POST /api/auth/login            返回 loginURL 和 tokenURL
+    GET  /login/<id>                模拟在浏览器中完成登录
+    GET  /api/auth/token/<id>       长轮询，登录完成（或超过 --login-delay 秒）后返回 token
+    POST /api/s3/upload             返回临时凭证，已上传过的 key 返回“文件已存在”
+    S3   PutObject / HeadObject / CreateMultipartUpload / UploadPart /
+         CompleteMultipartUpload / AbortMultipartUpload（路径形式: /<bucket>/<key>）
+    GET  /files/<key>               下载已上传的文件，支持 Range
+不校验签名和 token。
+'''
+
+BUCKET = "byrdocs"
+IO_CHUNK = 64 * 1024
+FAULT_EXEMPT = ("/login/",)     # 模拟浏览器的请求不注入故障
+
+
+def parse_rate(text: str) -> float:
+    """解析 `512K`、`2M` 这样的字节速率"""
+    match = re.fullmatch(r"([\d.]+)\s*([KMG]?)B?", text.strip(), re.IGNORECASE)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"无法解析的速率: {text}")
+    return float(match.group(1)) * 1024 ** "_KMG".index(match.group(2).upper() or "_")
+
+
+class Faults:
+    def __init__(self, latency: float = 0, jitter: float = 0, bandwidth: float = 0, error_rate: float = 0,
+                 drop_rate: float = 0, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def roll(self) -> float:
+        with self.lock:
+            return self.random.random()
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+
+class State:
+    def __init__(self, storage: str, login_delay: float):
+        self.storage = storage
+        self.login_delay = login_delay
+        self.lock = threading.Lock()
+        self.logins: dict[str, float] = {}      # id -> 自动完成登录的时间
+        self.logged_in: dict[str, threading.Event] = {}
+        self.uploads: dict[str, str] = {}       # uploadId -> key
+        self.stats: dict[str, int] = {"requests": 0, "errors": 0, "drops": 0}
+
+    def object_path(self, key: str) -> str:
+        return os.path.join(self.storage, BUCKET, key.replace("/", "_"))
+
+    def part_path(self, upload_id: str, number: int) -> str:
+        return os.path.join(self.storage, ".uploads", upload_id, f"{number:05d}")
+
+    def count(self, name: str) -> None:
+        with self.lock:
+            self.stats[name] += 1
+
+
+class _Dropped(Exception):
+    pass
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # boto3 上传时使用 Expect: 100-continue 和长连接
+    server: MockServer
+
+    # ---- 故障注入 ----
+
+    def _inject(self) -> bool:
+        """返回 True 表示已经以故障结束了这个请求"""
+        state, faults = self.server.state, self.server.faults
+        state.count("requests")
+        if self.path.startswith(FAULT_EXEMPT):
+            return False
+        if (delay := faults.delay()) > 0:
+            time.sleep(delay)
+        if faults.drop_rate and faults.roll() < faults.drop_rate:
+            state.count("drops")
+            self._drop()
+        if faults.error_rate and faults.roll() < faults.error_rate:
+            state.count("errors")
+            self._discard_body()
+            if self._is_s3():
+                self._xml(503, "<Error><Code>SlowDown</Code><Message>Injected fault</Message></Error>")
+            else:
+                self._send(503, b"Service Unavailable (injected)", "text/plain")
+            return True
+        return False
+
+    def _drop(self) -> None:
+        # 读取一部分请求体后直接断开，模拟网络中断
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self._read(int(length * self.server.faults.roll()))
+        self.close_connection = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        raise _Dropped()
+
+    def _throttle(self, size: int) -> None:
+        if self.server.faults.bandwidth:
+            time.sleep(size / self.server.faults.bandwidth)
+
+    def handle_one_request(self) -> None:
+        try:
+            super().handle_one_request()
+        except (_Dropped, ConnectionError):
+            self.close_connection = True
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # ---- 读写 ----
+
+    def _read(self, length: int) -> bytes:
+        data = bytearray()
+        while len(data) < length:
+            chunk = self.rfile.read(min(IO_CHUNK, length - len(data)))
+            if not chunk:
+                raise ConnectionError("连接提前关闭")
+            self._throttle(len(chunk))
+            data += chunk
+        return bytes(data)
+
+    def _read_to_file(self, path: str) -> str:
+        """把请求体写入文件，返回 MD5"""
+        length = int(self.headers.get("Content-Length") or 0)
+        md5 = hashlib.md5()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            remaining = length
+            while remaining:
+                chunk = self.rfile.read(min(IO_CHUNK, remaining))
+                if not chunk:
+                    os.remove(tmp_path)
+                    raise ConnectionError("连接提前关闭")
+                self._throttle(len(chunk))
+                f.write(chunk)
+                md5.update(chunk)
+                remaining -= len(chunk)
+        os.replace(tmp_path, path)
+        return md5.hexdigest()
+
+    def _discard_body(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        while length:
+            chunk = self.rfile.read(min(IO_CHUNK, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/octet-stream",
+              headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            for i in range(0, len(body), IO_CHUNK):
+                self._throttle(min(IO_CHUNK, len(body) - i))
+                self.wfile.write(body[i:i + IO_CHUNK])
+
+    def _json(self, data: dict, status: int = 200) -> None:
+        self._send(status, json.dumps(data, ensure_ascii=False).encode(), "application/json")
+
+    def _xml(self, status: int, body: str = "", headers: dict[str, str] | None = None) -> None:
+        payload = f'<?xml version="1.0" encoding="UTF-8"?>\n{body}'.encode() if body else b""
+        self._send(status, payload, "application/xml", headers)
+
+    def _is_s3(self) -> bool:
+        return urlsplit(self.path).path.startswith(f"/{BUCKET}/")
+
+    # ---- 路由 ----
+
+    def do_POST(self) -> None:
+        if self._inject():
+            return
+        url = urlsplit(self.path)
+        if url.path == "/api/auth/login":
+            self._discard_body()
+            return self._login()
+        if url.path == "/api/s3/upload":
+            return self._request_upload()
+        if self._is_s3():
+            query = parse_qs(url.query, keep_blank_values=True)
+            if "uploads" in query:
+                self._discard_body()
+                return self._create_multipart(self._key(url.path))
+            if "uploadId" in query:
+                return self._complete_multipart(self._key(url.path), query["uploadId"][0])
+        self._discard_body()
+        self._send(404)
+
+    def do_GET(self) -> None:
+        if self._inject():
+            return
+        path = urlsplit(self.path).path
+        if path.startswith("/login/"):
+            return self._browser_login(path[len("/login/"):])
+        if path.startswith("/api/auth/token/"):
+            return self._token(path[len("/api/auth/token/"):])
+        if path.startswith("/files/"):
+            return self._download(unquote(path[len("/files/"):]))
+        if self._is_s3():
+            return self._download(self._key(path))
+        self._send(404)
+
+    def do_HEAD(self) -> None:
+        if self._inject():
+            return
+        path = urlsplit(self.path).path
+        if path.startswith("/files/"):
+            return self._download(unquote(path[len("/files/"):]))
+        if self._is_s3():
+            return self._head_object(self._key(path))
+        self._send(404)
+
+    def do_PUT(self) -> None:
+        if self._inject():
+            return
+        url = urlsplit(self.path)
+        if not self._is_s3():
+            self._discard_body()
+            return self._send(404)
+        query = parse_qs(url.query)
+        key = self._key(url.path)
+        if "uploadId" in query:
+            upload_id = query["uploadId"][0]
+            if upload_id not in self.server.state.uploads:
+                self._discard_body()
+                return self._xml(404, "<Error><Code>NoSuchUpload</Code></Error>")
+            md5 = self._read_to_file(self.server.state.part_path(upload_id, int(query["partNumber"][0])))
+        else:
+            md5 = self._read_to_file(self.server.state.object_path(key))
+            with open(self.server.state.object_path(key) + ".etag", "w") as f:
+                f.write(md5)
+        self._xml(200, headers={"ETag": f'"{md5}"'})
+
+    def do_DELETE(self) -> None:
+        if self._inject():
+            return
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if self._is_s3() and "uploadId" in query:
+            upload_id = query["uploadId"][0]
+            with self.server.state.lock:
+                self.server.state.uploads.pop(upload_id, None)
+            shutil.rmtree(os.path.dirname(self.server.state.part_path(upload_id, 0)), ignore_errors=True)
+            return self._send(204)
+        self._send(404)
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return unquote(path[len(f"/{BUCKET}/"):])
+
+    # ---- API ----
+
+    def _base(self) -> str:
+        return f"http://{self.headers.get('Host', '%s:%d' % self.server.server_address[:2])}"
+
+    def _login(self) -> None:
+        login_id = uuid.uuid4().hex
+        state = self.server.state
+        with state.lock:
+            state.logins[login_id] = time.time() + state.login_delay
+            state.logged_in[login_id] = threading.Event()
+        self._json({"loginURL": f"{self._base()}/login/{login_id}",
+                    "tokenURL": f"{self._base()}/api/auth/token/{login_id}"})
+
+    def _browser_login(self, login_id: str) -> None:
+        event = self.server.state.logged_in.get(login_id)
+        if event is None:
+            return self._send(404, "登录链接无效".encode(), "text/plain; charset=utf-8")
+        event.set()
+        self._send(200, "登录成功，可以关闭此页面".encode(), "text/plain; charset=utf-8")
+
+    def _token(self, login_id: str) -> None:
+        state = self.server.state
+        event = state.logged_in.get(login_id)
+        if event is None:
+            return self._json({"success": False, "error": "登录请求不存在"}, 404)
+        # 浏览器中完成登录或超过 login_delay 后返回 token，客户端超时前一直挂起
+        event.wait(max(0.0, state.logins[login_id] - time.time()))
+        self._json({"success": True, "token": f"mock-{login_id}"})
+
+    def _request_upload(self) -> None:
+        try:
+            key = json.loads(self._read(int(self.headers.get("Content-Length") or 0)) or b"{}").get("key", "")
+        except ValueError:
+            return self._json({"success": False, "error": "请求格式错误"}, 400)
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._json({"success": False, "error": "未登录"}, 401)
+        if not re.fullmatch(r"[0-9a-f]{32}\.(pdf|zip)", key):
+            return self._json({"success": False, "error": "文件名格式错误"}, 400)
+        if os.path.exists(self.server.state.object_path(key)):
+            return self._json({"success": False, "error": "文件已存在"})
+        self._json({
+            "success": True,
+            "bucket": BUCKET,
+            "key": key,
+            "tags": {"status": "temp"},
+            "credentials": {"access_key_id": "mock", "secret_access_key": "mock", "session_token": "mock"},
+        })
+
+    # ---- S3 ----
+
+    def _head_object(self, key: str) -> None:
+        path = self.server.state.object_path(key)
+        if not os.path.exists(path):
+            return self._send(404)
+        with open(path + ".etag") as f:
+            etag = f.read()
+        # HEAD 响应的 Content-Length 是对象大小，不能用 _send
+        self.send_response(200)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.send_header("ETag", f'"{etag}"')
+        self.end_headers()
+
+    def _create_multipart(self, key: str) -> None:
+        upload_id = uuid.uuid4().hex
+        with self.server.state.lock:
+            self.server.state.uploads[upload_id] = key
+        os.makedirs(os.path.dirname(self.server.state.part_path(upload_id, 0)), exist_ok=True)
+        self._xml(200, f"<InitiateMultipartUploadResult><Bucket>{BUCKET}</Bucket><Key>{key}</Key>"
+                       f"<UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>")
+
+    def _complete_multipart(self, key: str, upload_id: str) -> None:
+        body = self._read(int(self.headers.get("Content-Length") or 0)).decode()
+        state = self.server.state
+        if state.uploads.get(upload_id) != key:
+            return self._xml(404, "<Error><Code>NoSuchUpload</Code></Error>")
+        numbers = [int(number) for number in re.findall(r"<PartNumber>(\d+)</PartNumber>", body)]
+        digests = []
+        path = state.object_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as out:
+            for number in numbers:
+                md5 = hashlib.md5()
+                with open(state.part_path(upload_id, number), "rb") as f:
+                    while chunk := f.read(1024**2):
+                        md5.update(chunk)
+                        out.write(chunk)
+                digests.append(md5.digest())
+        os.replace(path + ".tmp", path)
+        etag = f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+        with open(path + ".etag", "w") as f:
+            f.write(etag)
+        with state.lock:
+            state.uploads.pop(upload_id, None)
+        shutil.rmtree(os.path.dirname(state.part_path(upload_id, 0)), ignore_errors=True)
+        self._xml(200, f"<CompleteMultipartUploadResult><Bucket>{BUCKET}</Bucket><Key>{key}</Key>"
+                       f"<ETag>\"{etag}\"</ETag></CompleteMultipartUploadResult>")
+
+    def _download(self, key: str) -> None:
+        path = self.server.state.object_path(key)
+        if not os.path.exists(path):
+            return self._send(404)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        if (match := re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))) is not None:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            status = 206
+        self.send_response(status)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        with open(path + ".etag") as f:
+            self.send_header("ETag", f'"{f.read()}"')
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if self.command == "HEAD":
+            return
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining:
+                chunk = f.read(min(IO_CHUNK, remaining))
+                self._throttle(len(chunk))
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], state: State, faults: Faults, verbose: bool = False):
+        super().__init__(address, Handler)
+        self.state = state
+        self.faults = faults
+        self.verbose = verbose
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m byrdocs.mock_server", description="本地模拟 BYR Docs 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--storage", help="保存上传文件的目录，默认为临时目录")
+    parser.add_argument("--latency", type=float, default=0, help="每个请求增加的延迟（秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="延迟的随机波动范围（秒）")
+    parser.add_argument("--bandwidth", type=parse_rate, default=0, help="每个连接的带宽上限，如 512K、2M")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回 503 的概率")
+    parser.add_argument("--drop-rate", type=float, default=0, help="读取部分请求后直接断开连接的概率")
+    parser.add_argument("--login-delay", type=float, default=3, help="未访问登录链接时，多少秒后自动完成登录")
+    parser.add_argument("--seed", type=int, help="随机数种子，便于复现")
+    parser.add_argument("--verbose", "-v", action="store_true", help="输出每个请求")
+    args = parser.parse_args()
+
+    storage = args.storage or tempfile.mkdtemp(prefix="byrdocs-mock-")
+    state = State(storage, args.login_delay)
+    faults = Faults(args.latency, args.jitter, args.bandwidth, args.error_rate, args.drop_rate, args.seed)
+    server = MockServer((args.host, args.port), state, faults, args.verbose)
+    base = f"http://{args.host}:{server.server_address[1]}"
+    print(f"模拟服务已启动，文件保存在 {storage}")
+    print(f"  export BYRDOCS_BASE_URL={base} BYRDOCS_S3_ENDPOINT={base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"\n共 {state.stats['requests']} 个请求，注入错误 {state.stats['errors']} 次，断开连接 {state.stats['drops']} 次")
+        if args.storage is None:
+            shutil.rmtree(storage, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import os
+import struct
+import unicodedata
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator
+
+'''
+把目录打包为可复现的 ZIP：在 zlib 版本和压缩级别（LEVEL）相同时，同样的内容总是得到同样的字节，
+因而 MD5 相同，服务器端去重不受影响。deflate 的输出只由 zlib 的实现决定，不同版本（或打了补丁的系统 zlib、
+zlib-ng 等）可能得到不同的压缩结果，因此不保证不同机器上打包同一目录的 MD5 相同；打包时会输出所用的
+zlib.ZLIB_RUNTIME_VERSION，MD5 不一致时可据此排查。
+
+- 成员按 UTF-8 编码后的相对路径排序，文件名统一为 NFC（macOS 上的文件名为 NFD）；
+- 修改时间固定为 1980-01-01 00:00，权限固定为 0644，不包含目录项、隐藏文件和符号链接；
+- 每个文件切成 CHUNK_SIZE 的块，在线程池中各自独立 deflate（zlib 压缩时释放 GIL），
+  除最后一块外以 Z_SYNC_FLUSH 结束，按顺序拼接后即是合法的 deflate 流（与 pigz 的做法相同）；
+- 成员使用数据描述符（通用标志位 3），CRC 和大小写在数据之后，整个 ZIP 只需顺序写出一遍。
+
+https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+'''
+
+CHUNK_SIZE = 1024**2
+LEVEL = 6
+
+FIXED_TIME = 0                      # 00:00:00
+FIXED_DATE = (0 << 9) | (1 << 5) | 1  # 1980-01-01
+FILE_MODE = 0o100644
+FLAGS = 0x0008 | 0x0800             # 数据描述符 | 文件名为 UTF-8
+ZIP64_LIMIT = 0xF0000000            # 留出余量：压缩后的大小可能略大于原大小
+
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+DATA_DESCRIPTOR = struct.Struct("<4s3L")
+DATA_DESCRIPTOR64 = struct.Struct("<4sL2Q")
+EOCD = struct.Struct("<4s4H2LH")
+ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")
+ZIP64_LOCATOR = struct.Struct("<4sLQL")
+
+
+def members(directory: str) -> list[tuple[str, str]]:
+    """返回排序后的 (ZIP 中的名称, 文件路径)"""
+    result = []
+
+    def walk(path: str, prefix: str) -> None:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith(".") or entry.is_symlink():
+                    continue
+                name = prefix + unicodedata.normalize("NFC", entry.name)
+                if entry.is_dir():
+                    walk(entry.path, name + "/")
+                elif entry.is_file():
+                    result.append((name, entry.path))
+
+    walk(directory, "")
+    result.sort(key=lambda item: item[0].encode("utf-8"))
+    return result
+
+
+def _compress(chunk: bytes, last: bool) -> bytes:
+    compressor = zlib.compressobj(LEVEL, zlib.DEFLATED, -15)
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+
+def _chunks(files: list[tuple[str, str]]) -> Iterator[tuple[int, bytes, bool]]:
+    for index, (_, path) in enumerate(files):
+        with open(path, "rb") as f:
+            chunk = f.read(CHUNK_SIZE)
+            while True:
+                next_chunk = f.read(CHUNK_SIZE) if chunk else b""
+                yield index, chunk, not next_chunk
+                if not next_chunk:
+                    break
+                chunk = next_chunk
+
+
+def _ordered_map(executor: ThreadPoolExecutor, items: Iterator[tuple[int, bytes, bool]],
+                 lookahead: int) -> Iterator[tuple[int, bytes, bool, bytes]]:
+    """按顺序返回压缩结果，同时最多有 lookahead 块在内存中，大文件也不会占用过多内存"""
+    pending: deque = deque()
+    for index, chunk, last in items:
+        pending.append((index, chunk, last, executor.submit(_compress, chunk, last)))
+        if len(pending) >= lookahead:
+            index, chunk, last, future = pending.popleft()
+            yield index, chunk, last, future.result()
+    while pending:
+        index, chunk, last, future = pending.popleft()
+        yield index, chunk, last, future.result()
+
+
+class _Entry:
+    __slots__ = ("name", "offset", "crc", "size", "compressed_size", "zip64")
+
+    def __init__(self, name: str, offset: int, zip64: bool):
+        self.name = name.encode("utf-8")
+        self.offset = offset
+        self.crc = 0
+        self.size = 0
+        self.compressed_size = 0
+        self.zip64 = zip64
+
+
+def pack(directory: str, write: Callable[[bytes], object], workers: int | None = None) -> int:
+    """把目录打包为 ZIP 并依次交给 write，返回成员数"""
+    files = members(directory)
+    entries: list[_Entry] = []
+    offset = 0
+
+    def emit(data: bytes) -> None:
+        nonlocal offset
+        write(data)
+        offset += len(data)
+
+    def finish(entry: _Entry) -> None:
+        if entry.zip64:
+            emit(DATA_DESCRIPTOR64.pack(b"PK\x07\x08", entry.crc, entry.compressed_size, entry.size))
+        else:
+            emit(DATA_DESCRIPTOR.pack(b"PK\x07\x08", entry.crc, entry.compressed_size, entry.size))
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        entry: _Entry | None = None
+        for index, chunk, last, compressed in _ordered_map(executor, _chunks(files), workers * 4):
+            if entry is None:
+                name, path = files[index]
+                zip64 = os.path.getsize(path) >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+                entry = _Entry(name, offset, zip64)
+                # 本地文件头中不写 CRC 和大小，真实值在数据描述符中
+                extra = struct.pack("<2H2Q", 0x0001, 16, 0, 0) if zip64 else b""
+                size_field = 0xFFFFFFFF if zip64 else 0
+                emit(LOCAL_HEADER.pack(b"PK\x03\x04", 45 if zip64 else 20, FLAGS, zlib.DEFLATED, FIXED_TIME,
+                                       FIXED_DATE, 0, size_field, size_field, len(entry.name), len(extra)))
+                emit(entry.name + extra)
+            entry.crc = zlib.crc32(chunk, entry.crc)
+            entry.size += len(chunk)
+            entry.compressed_size += len(compressed)
+            emit(compressed)
+            if last:
+                finish(entry)
+                entries.append(entry)
+                entry = None
+
+    cd_offset = offset
+    for entry in entries:
+        zip64 = entry.zip64 or entry.offset >= 0xFFFFFFFF
+        extra = struct.pack("<2H3Q", 0x0001, 24, entry.size, entry.compressed_size, entry.offset) if zip64 else b""
+        emit(CENTRAL_HEADER.pack(
+            b"PK\x01\x02", (3 << 8) | 45, 45 if zip64 else 20, FLAGS, zlib.DEFLATED, FIXED_TIME, FIXED_DATE,
+            entry.crc, 0xFFFFFFFF if zip64 else entry.compressed_size, 0xFFFFFFFF if zip64 else entry.size,
+            len(entry.name), len(extra), 0, 0, 0, FILE_MODE << 16, 0xFFFFFFFF if zip64 else entry.offset,
+        ))
+        emit(entry.name + extra)
+    cd_size = offset - cd_offset
+
+    count = len(entries)
+    if count >= 0xFFFF or cd_offset >= 0xFFFFFFFF or cd_size >= 0xFFFFFFFF:
+        zip64_offset = offset
+        emit(ZIP64_EOCD.pack(b"PK\x06\x06", ZIP64_EOCD.size - 12, 45, 45, 0, 0, count, count, cd_size, cd_offset))
+        emit(ZIP64_LOCATOR.pack(b"PK\x06\x07", 0, zip64_offset, 1))
+        emit(EOCD.pack(b"PK\x05\x06", 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0))
+    else:
+        emit(EOCD.pack(b"PK\x05\x06", 0, 0, count, count, cd_size, cd_offset, 0))
+    return count
@@ -0,0 +1,109 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import argparse
+
+from argcomplete.completers import DirectoriesCompleter, FilesCompleter
+
+'''
+命令行参数定义。补全时每按一次 Tab 都会启动一次进程，本模块只能导入 argparse 和 argcomplete，
+不要在这里导入 boto3、InquirerPy 等较重的模块。
+'''
+
+COMMANDS = ('login', 'logout', 'upload', 'init', 'validate', 'daemon', 'watch', 'sync', 'queue',
+            'dupes', 'info', 'search', 'missing', 'get', 'stats', 'hash')
+
+# 部分命令的第二个参数是子命令
+SUBCOMMANDS = {
+    'daemon': ('stop', 'status'),
+    'queue': ('drain', 'status'),
+}
+
+_files = FilesCompleter()
+
+
+def complete_command(prefix: str, **kwargs):
+    # 第一个参数既可以是命令，也可以直接是要上传的文件
+    return [command for command in COMMANDS if command.startswith(prefix)] + list(_files(prefix, **kwargs))
+
+
+def complete_file(prefix: str, parsed_args: argparse.Namespace, **kwargs):
+    subcommands = [name for name in SUBCOMMANDS.get(parsed_args.command, ()) if name.startswith(prefix)]
+    return subcommands + list(_files(prefix, parsed_args=parsed_args, **kwargs))
+
+
+command_parser = argparse.ArgumentParser(
+    prog="byrdocs",
+    description=
+        "命令：\n" +
+        "  upload <文件路径>    上传文件，`-` 表示从标准输入读取 [默认命令]\n" +
+        "  login               登录到 BYR Docs\n" +
+        "  logout              退出登录\n"+
+        "  init [文件|md5]      交互式生成文件元信息文件，指定 --type 时直接根据参数生成\n"+
+        "  validate            (待实现) 验证元信息文件的合法性\n"+
+        "  daemon [stop|status] 启动、停止或查看常驻后台的守护进程\n"+
+        "  watch <目录>         监视目录，自动上传新出现的文件\n"+
+        "  sync <目录>          上传目录中尚未上传过的文件\n"+
+        "  queue <文件|drain|status> 加入离线上传队列、上传队列中的文件或查看队列\n"+
+        "  dupes <目录>         查找目录中内容相同的文件\n"+
+        "  info <文件|目录>     读取 PDF 的标题、作者和页数，或列出 ZIP 的内容\n"+
+        "  search <关键词>      在本地的元信息文件中搜索，如 \"高等数学A（上） stage:期末\"\n"+
+        "  missing [目录]       列出上传历史中还没有元信息文件的记录\n"+
+        "  get <md5|链接...>    下载文件，支持断点续传并校验 MD5\n"+
+        "  stats               查看上传速度等统计信息和传输设置建议\n"+
+        "  hash <文件|目录...>  计算文件在 BYR Docs 上的文件名 <md5>.<pdf|zip>，不上传\n",
+    formatter_class=argparse.RawDescriptionHelpFormatter,
+    epilog=
+        "示例：\n" +
+        "  $ byrdocs upload 大物实验.zip\n" +
+        "  $ pandoc notes.md -t pdf -o - | byrdocs upload -\n" +
+        "  $ byrdocs upload --pack ./大物实验报告\n" +
+        "  $ byrdocs login\n" +
+        "  $ byrdocs /home/exam_paper.pdf\n" +
+        "  $ byrdocs logout\n" +
+        "  $ byrdocs init\n" +
+        "  $ byrdocs init 工科数学分析基础(上).pdf\n" +
+        "  $ byrdocs init 期末.pdf --type test --course \"高等数学A（上）\" --year 2023-2024 --stage 期末 --content 原题\n" +
+        "  $ byrdocs daemon\n" +
+        "  $ byrdocs watch ~/scans --workers 2\n" +
+        "  $ byrdocs sync ~/course-materials --dry-run\n" +
+        "  $ byrdocs queue drain\n" +
+        "  $ byrdocs dupes ~/donated\n" +
+        "  $ byrdocs info ~/textbooks > info.jsonl\n" +
+        "  $ byrdocs search \"type:test 期末 高等数学\"\n" +
+        "  $ byrdocs get https://byrdocs.org/files/<md5>.pdf -o ~/mirror\n" +
+        "  $ byrdocs hash ~/archive --format jsonl > manifest.jsonl\n"
+    )
+# command_parser.add_argument('--help', '-h', action='help', help='Show this help message and exit')
+command_parser.add_argument("command", nargs='?', help="要执行的命令").completer = complete_command
+command_parser.add_argument("file", nargs='?', help="要上传的文件路径").completer = complete_file
+command_parser.add_argument("more", nargs='*', help=argparse.SUPPRESS)     # get 和 hash 可以一次指定多个文件
+command_parser.add_argument("--token", help="指定登录时使用的 token")
+command_parser.add_argument("--manually", "-m", action='store_true')
+command_parser.add_argument("--workers", type=int, help="并发数，上传默认为 4，计算哈希默认为 CPU 核数")
+command_parser.add_argument("--poll", action='store_true', help="watch 使用定时扫描代替 inotify")
+command_parser.add_argument("--dry-run", action='store_true', help="sync 只显示需要上传的文件，不实际上传")
+command_parser.add_argument("--pack", metavar="DIR", help="把目录打包为 ZIP 后上传，zlib 版本相同时结果可复现").completer = DirectoriesCompleter()
+command_parser.add_argument("--output", "-o", metavar="DIR", help="get 下载到的目录或 init 写入元信息文件的目录，默认为当前目录").completer = DirectoriesCompleter()
+command_parser.add_argument("--verify", action='store_true', help="上传前后比对服务器上对象的大小和 ETag，一致则跳过上传")
+command_parser.add_argument("--trace", metavar="FILE", help="把各阶段耗时写入 Chrome trace 格式的 JSON 文件，可在 Perfetto 中查看")
+command_parser.add_argument("--format", choices=("tsv", "jsonl"), default="tsv", help="hash 的输出格式，默认为 tsv")
+
+# 指定 --type 时 init 不进入交互界面，见 byrdocs.init_flags
+init_group = command_parser.add_argument_group("init 参数", "指定 --type 时 init 不进入交互界面，直接根据参数生成元信息文件，可重复指定的参数用于多个值")
+init_group.add_argument("--type", choices=("book", "test", "doc"), help="文件类型：书籍、试题或资料")
+init_group.add_argument("--title", help="书籍或资料的标题，PDF 内嵌标题时可省略")
+init_group.add_argument("--author", action='append', help="书籍作者，可重复指定")
+init_group.add_argument("--translator", action='append', help="书籍译者，可重复指定")
+init_group.add_argument("--edition", help="书籍版次，如 2 或 第二版")
+init_group.add_argument("--publisher", help="出版社")
+init_group.add_argument("--publish-year", help="出版年份")
+init_group.add_argument("--isbn", action='append', help="ISBN-10 或 ISBN-13，可重复指定")
+init_group.add_argument("--college", action='append', help="考试学院全称，可重复指定")
+init_group.add_argument("--course", help="课程全称，如「高等数学A（上）」")
+init_group.add_argument("--course-type", choices=("本科", "研究生"), help="学段")
+init_group.add_argument("--year", help="考试学年，如 2023-2024，只能精确到某一年时填写该年份")
+init_group.add_argument("--semester", help="考试学期：First 或 Second（1、2）")
+init_group.add_argument("--stage", choices=("期中", "期末"), help="考试阶段")
+init_group.add_argument("--content", action='append', help="内容类型，试题为 原题、答案，资料为 思维导图、题库、答案、知识点、课件，可重复指定")
+init_group.add_argument("--force", action='store_true', help="覆盖已存在的元信息文件")
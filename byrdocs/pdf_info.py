@@ -0,0 +1,438 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import html
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Iterable
+
+'''
+从 PDF 末尾的 trailer 和交叉引用表出发，只读取 Info 字典、文档目录和页面树根节点，
+提取标题、作者和页数，不解析页面内容，即使是几百 MB 的扫描版教材也只需读取几十 KB。
+
+支持传统 xref 表、xref 流（含 PNG 预测器）、对象流和增量更新（/Prev）。
+任何解析失败都只会让对应字段为空，不会抛出异常；解压后超过 MAX_STREAM_SIZE 的流视为损坏。
+'''
+
+TAIL_SIZE = 4096
+CHUNK_SIZE = 8192
+MAX_OBJECT_SIZE = 4 * 1024**2
+MAX_STREAM_SIZE = 8 * 1024**2     # 解压后的上限，防止很小的压缩流解压出数 GB 的数据
+
+WHITESPACE = b" \t\r\n\f\0"
+DELIMITERS = b"()<>[]{}/%"
+
+
+class Ref:
+    __slots__ = ("num", "gen")
+
+    def __init__(self, num: int, gen: int):
+        self.num = num
+        self.gen = gen
+
+
+class _Keyword(str):
+    """stream、endobj、R 等关键字，与名称（str）和字符串（bytes）区分"""
+
+
+class _Parser:
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def skip_whitespace(self) -> None:
+        data = self.data
+        while self.pos < len(data):
+            c = data[self.pos]
+            if c in WHITESPACE:
+                self.pos += 1
+            elif c == 0x25:     # % 注释
+                while self.pos < len(data) and data[self.pos] not in b"\r\n":
+                    self.pos += 1
+            else:
+                break
+
+    def _regular(self) -> bytes:
+        start = self.pos
+        while self.pos < len(self.data) and self.data[self.pos] not in WHITESPACE + DELIMITERS:
+            self.pos += 1
+        return self.data[start:self.pos]
+
+    def parse(self):
+        self.skip_whitespace()
+        data = self.data
+        if self.pos >= len(data):
+            raise IndexError("unexpected end of data")
+        c = data[self.pos:self.pos + 1]
+        if data.startswith(b"<<", self.pos):
+            return self._dict()
+        if c == b"<":
+            return self._hex_string()
+        if c == b"(":
+            return self._literal_string()
+        if c == b"[":
+            self.pos += 1
+            array = []
+            while True:
+                self.skip_whitespace()
+                if data[self.pos:self.pos + 1] == b"]":
+                    self.pos += 1
+                    return array
+                array.append(self.parse())
+        if c == b"/":
+            self.pos += 1
+            return re.sub(rb"#([0-9a-fA-F]{2})", lambda m: bytes([int(m.group(1), 16)]),
+                          self._regular()).decode("latin-1")
+        token = self._regular()
+        if not token:
+            raise ValueError(f"unexpected byte {c!r}")
+        if re.fullmatch(rb"[+-]?\d+", token):
+            # 尝试匹配间接引用 `num gen R`
+            saved = self.pos
+            self.skip_whitespace()
+            gen = self._regular()
+            self.skip_whitespace()
+            if gen.isdigit() and self._regular() == b"R":
+                return Ref(int(token), int(gen))
+            self.pos = saved
+            return int(token)
+        if re.fullmatch(rb"[+-]?(\d+\.?\d*|\.\d+)", token):
+            return float(token)
+        if token in (b"true", b"false"):
+            return token == b"true"
+        if token == b"null":
+            return None
+        return _Keyword(token.decode("latin-1"))
+
+    def _dict(self) -> dict:
+        self.pos += 2
+        result = {}
+        while True:
+            self.skip_whitespace()
+            if self.data.startswith(b">>", self.pos):
+                self.pos += 2
+                return result
+            key = self.parse()
+            result[key] = self.parse()
+
+    def _hex_string(self) -> bytes:
+        end = self.data.index(b">", self.pos)
+        digits = re.sub(rb"\s", b"", self.data[self.pos + 1:end])
+        self.pos = end + 1
+        if len(digits) % 2:
+            digits += b"0"
+        return bytes.fromhex(digits.decode("ascii"))
+
+    def _literal_string(self) -> bytes:
+        data = self.data
+        self.pos += 1
+        depth = 1
+        result = bytearray()
+        escapes = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f"}
+        while True:
+            c = data[self.pos:self.pos + 1]
+            if not c:
+                raise IndexError("unterminated string")
+            self.pos += 1
+            if c == b"\\":
+                c = data[self.pos:self.pos + 1]
+                self.pos += 1
+                if c in escapes:
+                    result += escapes[c]
+                elif c.isdigit():
+                    octal = re.match(rb"[0-7]{1,3}", data[self.pos - 1:self.pos + 2]).group()
+                    self.pos += len(octal) - 1
+                    result.append(int(octal, 8) & 0xFF)
+                elif c == b"\r":    # 续行
+                    if data[self.pos:self.pos + 1] == b"\n":
+                        self.pos += 1
+                elif c != b"\n":
+                    result += c
+                continue
+            if c == b"(":
+                depth += 1
+            elif c == b")":
+                depth -= 1
+                if depth == 0:
+                    return bytes(result)
+            result += c
+
+
+def _png_unpredict(data: bytes, columns: int) -> bytes:
+    # https://www.w3.org/TR/PNG-Filters.html，xref 流中每个像素为 1 字节
+    row_size = columns + 1
+    previous = bytearray(columns)
+    output = bytearray()
+    for start in range(0, len(data) - columns, row_size):
+        kind, row = data[start], bytearray(data[start + 1:start + row_size])
+        for i in range(len(row)):
+            left = row[i - 1] if i else 0
+            up = previous[i]
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + up) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + (left + up) // 2) & 0xFF
+            elif kind == 4:
+                up_left = previous[i - 1] if i else 0
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else up if pb <= pc else up_left)) & 0xFF
+        output += row
+        previous = row
+    return bytes(output)
+
+
+class _PdfReader:
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.size = os.fstat(f.fileno()).st_size
+        self.xref: dict[int, tuple] = {}     # num -> (1, offset) | (2, stream_num, index)
+        self.trailer: dict = {}
+        self._object_streams: dict[int, tuple[bytes, list[tuple[int, int]], int]] = {}
+        self._load_xref(self._startxref())
+
+    def _read(self, offset: int, length: int) -> bytes:
+        self.f.seek(offset)
+        return self.f.read(length)
+
+    def _startxref(self) -> int:
+        tail = self._read(max(0, self.size - TAIL_SIZE), TAIL_SIZE)
+        match = re.search(rb"startxref\s+(\d+)", tail[tail.rfind(b"startxref"):])
+        if match is None:
+            raise ValueError("startxref not found")
+        return int(match.group(1))
+
+    def _load_xref(self, offset: int) -> None:
+        visited = set()
+        while offset is not None and offset not in visited and len(visited) < 64:
+            visited.add(offset)
+            head = self._read(offset, 16)
+            if head.lstrip().startswith(b"xref"):
+                trailer = self._load_xref_table(offset)
+                if isinstance(trailer.get("XRefStm"), int):     # 混合引用文件
+                    self._load_xref_stream(trailer["XRefStm"])
+            else:
+                trailer = self._load_xref_stream(offset)
+            for key, value in trailer.items():
+                self.trailer.setdefault(key, value)     # 较新的 trailer 优先
+            offset = trailer.get("Prev")
+
+    def _set(self, num: int, entry: tuple) -> None:
+        self.xref.setdefault(num, entry)    # 从最新的更新开始读取，先出现的为准
+
+    def _load_xref_table(self, offset: int) -> dict:
+        data = self._read(offset, CHUNK_SIZE)
+        pos = data.index(b"xref") + 4
+        entry_pattern = re.compile(rb"(\d{10})\s(\d{5})\s([nf])")
+        while True:
+            header = re.compile(rb"\s*(\d+)\s+(\d+)\s").match(data, pos)
+            if header is None:
+                break
+            start, count = int(header.group(1)), int(header.group(2))
+            pos = header.end()
+            if len(data) - pos < count * 20 + 64:
+                data = data[:pos] + self._read(offset + pos, count * 20 + CHUNK_SIZE)
+            for i in range(count):
+                match = entry_pattern.search(data, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group(3) == b"n":
+                    self._set(start + i, (1, int(match.group(1))))
+        trailer_pos = data.index(b"trailer", pos) + len(b"trailer")
+        return self._parse_at(offset + trailer_pos)
+
+    def _parse_at(self, offset: int):
+        size = CHUNK_SIZE
+        while True:
+            data = self._read(offset, size)
+            try:
+                return _Parser(data).parse()
+            except (IndexError, ValueError):
+                if len(data) < size or size >= MAX_OBJECT_SIZE:
+                    raise
+                size *= 4
+
+    def _object_at(self, offset: int) -> tuple[object, bytes | None]:
+        size = CHUNK_SIZE
+        while True:
+            data = self._read(offset, size)
+            parser = _Parser(data)
+            try:
+                parser.parse()  # num
+                parser.parse()  # gen
+                if parser.parse() != "obj":
+                    raise ValueError("not an object")
+                value = parser.parse()
+                parser.skip_whitespace()
+                if not data.startswith(b"stream", parser.pos):
+                    return value, None
+                break
+            except IndexError:
+                if len(data) < size or size >= MAX_OBJECT_SIZE:
+                    raise
+                size *= 4
+        start = parser.pos + len(b"stream")
+        if data[start:start + 2] == b"\r\n":
+            start += 2
+        elif data[start:start + 1] in (b"\n", b"\r"):
+            start += 1
+        length = self.resolve(value.get("Length"))
+        if not isinstance(length, int) or length > MAX_OBJECT_SIZE:
+            raise ValueError("invalid stream length")
+        return value, self._read(offset + start, length)
+
+    def _decode(self, stream_dict: dict, data: bytes) -> bytes:
+        filters = self.resolve(stream_dict.get("Filter"))
+        filters = [filters] if isinstance(filters, str) else list(filters or [])
+        params = self.resolve(stream_dict.get("DecodeParms"))
+        if isinstance(params, list):
+            params = params[0] if params else None
+        for name in filters:
+            if name != "FlateDecode":
+                raise ValueError(f"unsupported filter {name}")
+            decompressor = zlib.decompressobj()
+            data = decompressor.decompress(data, MAX_STREAM_SIZE)
+            if decompressor.unconsumed_tail:
+                raise ValueError("stream too large")
+        if isinstance(params, dict) and self.resolve(params.get("Predictor", 1)) >= 10:
+            data = _png_unpredict(data, self.resolve(params.get("Columns", 1)))
+        return data
+
+    def _load_xref_stream(self, offset: int) -> dict:
+        stream_dict, raw = self._object_at(offset)
+        data = self._decode(stream_dict, raw)
+        widths = stream_dict["W"]
+        index = stream_dict.get("Index", [0, stream_dict["Size"]])
+        pos = 0
+        for start, count in zip(index[::2], index[1::2]):
+            for num in range(start, start + count):
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[pos:pos + width], "big"))
+                    pos += width
+                if pos > len(data):
+                    break
+                kind = fields[0] if widths[0] else 1
+                if kind == 1:
+                    self._set(num, (1, fields[1]))
+                elif kind == 2:
+                    self._set(num, (2, fields[1], fields[2]))
+        return stream_dict
+
+    def get(self, num: int):
+        entry = self.xref.get(num)
+        if entry is None:
+            return None
+        if entry[0] == 1:
+            return self._object_at(entry[1])[0]
+        stream_num, index = entry[1], entry[2]
+        if stream_num not in self._object_streams:
+            stream_dict, raw = self._object_at(self.xref[stream_num][1])
+            data = self._decode(stream_dict, raw)
+            first = stream_dict["First"]
+            header = _Parser(data[:first])
+            pairs = []
+            for _ in range(stream_dict["N"]):
+                pairs.append((header.parse(), header.parse()))
+            self._object_streams[stream_num] = (data, pairs, first)
+        data, pairs, first = self._object_streams[stream_num]
+        return _Parser(data, first + pairs[index][1]).parse()
+
+    def resolve(self, value, depth: int = 0):
+        while isinstance(value, Ref) and depth < 16:
+            value = self.get(value.num)
+            depth += 1
+        return value
+
+    def stream(self, ref) -> bytes | None:
+        if not isinstance(ref, Ref) or self.xref.get(ref.num, (0,))[0] != 1:
+            return None
+        stream_dict, raw = self._object_at(self.xref[ref.num][1])
+        return self._decode(stream_dict, raw) if raw is not None else None
+
+
+def decode_text(value) -> str | None:
+    if not isinstance(value, bytes):
+        return None
+    if value.startswith(b"\xfe\xff"):
+        text = value[2:].decode("utf-16-be", errors="ignore")
+    elif value.startswith(b"\xef\xbb\xbf"):
+        text = value[3:].decode("utf-8", errors="ignore")
+    else:
+        try:
+            text = value.decode("utf-8")
+        except UnicodeDecodeError:
+            text = value.decode("latin-1")     # 近似 PDFDocEncoding
+    text = text.replace("\0", "").strip()
+    return text or None
+
+
+def clean_title(title: str | None) -> str | None:
+    if title is None:
+        return None
+    title = re.sub(r"^Microsoft (Word|PowerPoint) - ", "", title).strip()
+    # 许多生成工具把源文件名当作标题
+    if not title or title.lower() in ("untitled", "无标题") or re.search(r"\.(docx?|pptx?|pdf|tex|dvi)$", title, re.I):
+        return None
+    return title
+
+
+def split_authors(author: str | None) -> list[str]:
+    if not author:
+        return []
+    return [name.strip() for name in re.split(r"[;；、,，]|\s+and\s+", author) if name.strip()]
+
+
+def _xmp(reader: _PdfReader, root: dict) -> tuple[str | None, list[str]]:
+    data = reader.stream(root.get("Metadata"))
+    if not data:
+        return None, []
+    text = data.decode("utf-8", errors="ignore")
+
+    def items(tag: str) -> list[str]:
+        block = re.search(rf"<dc:{tag}\b.*?</dc:{tag}>", text, re.S)
+        if block is None:
+            return []
+        return [html.unescape(item).strip() for item in re.findall(r"<rdf:li\b[^>]*>(.*?)</rdf:li>", block.group(), re.S)]
+
+    titles = items("title")
+    return (titles[0] if titles else None), [name for name in items("creator") if name]
+
+
+def extract(file: str) -> dict:
+    """返回 {"title": str | None, "authors": list[str], "pages": int | None}"""
+    result = {"title": None, "authors": [], "pages": None}
+    try:
+        with open(file, "rb") as f:
+            reader = _PdfReader(f)
+            info = reader.resolve(reader.trailer.get("Info"))
+            if isinstance(info, dict):
+                result["title"] = clean_title(decode_text(reader.resolve(info.get("Title"))))
+                result["authors"] = split_authors(decode_text(reader.resolve(info.get("Author"))))
+            root = reader.resolve(reader.trailer.get("Root"))
+            if isinstance(root, dict):
+                pages = reader.resolve(root.get("Pages"))
+                if isinstance(pages, dict) and isinstance(count := reader.resolve(pages.get("Count")), int):
+                    result["pages"] = count
+                if result["title"] is None or not result["authors"]:
+                    title, authors = _xmp(reader, root)
+                    result["title"] = result["title"] or clean_title(title)
+                    result["authors"] = result["authors"] or authors
+    except Exception:
+        pass
+    return result
+
+
+def _extract_with_path(file: str) -> dict:
+    return {"file": file, **extract(file)}
+
+
+def extract_many(files: Iterable[str], workers: int | None = None) -> Iterable[dict]:
+    """在进程池中并行提取，按输入顺序逐个返回结果"""
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_extract_with_path, files, chunksize=8)
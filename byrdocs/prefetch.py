@@ -0,0 +1,134 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import os
+import threading
+from typing import Callable
+
+from byrdocs import endpoints, trace
+from byrdocs.config import MULTIPART_THRESHOLD
+from byrdocs.fingerprint import HashCache, HashCancelled, file_digests, get_file_type
+
+'''
+在主菜单中输入文件路径时，路径一旦指向一个存在的文件就在后台线程中计算哈希，
+用户修改路径时取消之前的任务；按下 Enter 后复用结果，大文件也几乎可以立即开始上传。
+
+哈希一次读取同时得到 MD5 和分块 ETag，写入哈希缓存，之后无论在进程内还是由守护进程上传，
+fingerprint 和 multipart_etag 都直接命中缓存。
+
+哈希完成后再向 `/files/<md5>.<type>` 发送一次 HEAD 请求，检查文件是否已经上传过，结果显示在
+输入框下方；确认后如果已知文件存在，直接进入“文件已存在”的流程。HEAD 请求没有副作用，
+申请上传会在服务器上产生记录，仍在用户确认后进行。预先计算中的任何错误都被忽略，
+确认后按原来的流程重新计算并报告错误。
+'''
+
+EXISTS_TIMEOUT = 5
+
+
+class Prefetch:
+    """一个文件的预先计算结果"""
+
+    def __init__(self, file: str, stat: os.stat_result):
+        self.file = file
+        self.stat = stat
+        self.key: str | None = None
+        self.exists: bool | None = None    # 服务器上是否已有该文件，未知时为 None
+        self.hashed = threading.Event()
+        self.cancel = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def matches(self, file: str, stat: os.stat_result) -> bool:
+        return self.file == file and self.stat.st_size == stat.st_size and self.stat.st_mtime_ns == stat.st_mtime_ns
+
+    def wait(self) -> None:
+        """等待哈希完成，不等待存在性检查"""
+        if self._thread is not None:
+            self.hashed.wait()
+
+
+class Prefetcher:
+    def __init__(self, on_update: Callable[[], None] | None = None):
+        self.cache = HashCache()
+        self.on_update = on_update      # 存在性检查完成时调用，用于刷新界面
+        self._current: Prefetch | None = None
+        self._lock = threading.Lock()
+
+    def update(self, file: str) -> None:
+        """输入的路径变化时调用，file 不是文件时只取消之前的任务"""
+        try:
+            stat = os.stat(file)
+        except (OSError, ValueError):
+            stat = None
+        if stat is not None and not os.path.isfile(file):
+            stat = None
+        with self._lock:
+            current = self._current
+            if current is not None and stat is not None and current.matches(file, stat):
+                return
+            if current is not None:
+                current.cancel.set()
+            self._current = None
+            if stat is None:
+                return
+            self._current = prefetch = Prefetch(file, stat)
+            prefetch._thread = threading.Thread(target=self._run, args=(prefetch,), name="prefetch", daemon=True)
+            prefetch._thread.start()
+
+    def exists(self) -> bool:
+        """当前输入的文件是否已知在服务器上存在"""
+        with self._lock:
+            return self._current is not None and self._current.exists is True
+
+    def take(self, file: str) -> Prefetch | None:
+        """用户确认后调用，返回该文件的任务（可能仍在进行），其他任务被取消"""
+        self.update(file)
+        with self._lock:
+            return self._current
+
+    def _run(self, prefetch: Prefetch) -> None:
+        with trace.span("prefetch", file=prefetch.file, size=prefetch.stat.st_size):
+            try:
+                prefetch.key = self._fingerprint(prefetch)
+            except HashCancelled:
+                pass
+            except Exception:     # 确认后按原流程重新计算，由原流程报告错误
+                pass
+            finally:
+                prefetch.hashed.set()
+            if prefetch.key is None or prefetch.cancel.is_set():
+                return
+            prefetch.exists = self._exists(prefetch.key)
+            if prefetch.exists and not prefetch.cancel.is_set() and self.on_update is not None:
+                self.on_update()
+
+    def _fingerprint(self, prefetch: Prefetch) -> str | None:
+        entry = self.cache.lookup(prefetch.file, prefetch.stat)
+        if entry is not None and (prefetch.stat.st_size < MULTIPART_THRESHOLD or "etag" in entry):
+            file_type = entry["type"]
+            md5 = entry["md5"]
+        else:
+            file_type = get_file_type(prefetch.file)
+            if file_type == "unsupported":
+                return None
+            md5, etag = file_digests(prefetch.file, prefetch.cancel)
+            self.cache.store(prefetch.file, md5, file_type, prefetch.stat, etag)
+            self.cache.save()
+        if file_type == "unsupported" or not md5:
+            return None
+        return f"{md5}.{file_type}"
+
+    @staticmethod
+    def _exists(key: str) -> bool | None:
+        import requests
+
+        with trace.span("exists", cat="network", key=key):
+            try:
+                response = requests.head(f"{endpoints.api.current}/files/{key}", allow_redirects=True,
+                                         timeout=EXISTS_TIMEOUT)
+            except requests.RequestException:
+                return None
+        if response.status_code == 200:
+            return True
+        if response.status_code == 404:
+            return False
+        return None
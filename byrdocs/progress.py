@@ -0,0 +1,174 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from tqdm import tqdm
+
+'''
+并发传输的进度显示。
+
+boto3 每传输一块数据就在传输线程中调用一次回调，回调只把字节数追加到 deque
+（C 实现，线程安全，不需要加锁），由单独的渲染线程按固定频率汇总并刷新 tqdm，
+传输线程不会因重绘终端而阻塞。
+'''
+
+REFRESH_RATE = 10   # 每秒最多重绘次数
+
+
+class TransferTask:
+    __slots__ = ("name", "total", "done", "finished", "_chunks", "_bar")
+
+    def __init__(self, name: str, total: int):
+        self.name = name
+        self.total = total
+        self.done = 0
+        self.finished = False
+        self._chunks: deque[int] = deque()
+        self._bar: tqdm | None = None
+
+    def __call__(self, chunk: int) -> None:
+        self._chunks.append(chunk)
+
+    def finish(self) -> None:
+        self.finished = True
+
+    def _drain(self) -> int:
+        received = 0
+        chunks = self._chunks
+        while chunks:
+            received += chunks.popleft()
+        self.done += received
+        return received
+
+
+class TransferProgress:
+    """
+    用法:
+        with TransferProgress() as progress:
+            task = progress.add("a.pdf", size)
+            uploader.upload(file, data, callback=task)
+            task.finish()
+    多个文件同时传输时，除每个文件的进度条外还会显示一个汇总进度条。
+    """
+
+    def __init__(self, refresh_rate: float = REFRESH_RATE, show_total: bool = False):
+        self.interval = 1 / refresh_rate
+        self.show_total = show_total
+        self.tasks: list[TransferTask] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._total_bar: tqdm | None = None
+
+    def __enter__(self) -> TransferProgress:
+        if self.show_total:
+            self._total_bar = tqdm(total=0, unit='B', unit_scale=True, desc="Total", position=0)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add(self, name: str, total: int) -> TransferTask:
+        task = TransferTask(name, total)
+        with self._lock:
+            self.tasks.append(task)
+        return task
+
+    def track(self, task: TransferTask) -> None:
+        """显示一个已在进行中的任务，进度条从已完成的字节数开始"""
+        with self._lock:
+            self.tasks.append(task)
+
+    def write(self, message: str) -> None:
+        tqdm.write(message)     # 在进度条上方输出，不打乱进度条
+
+    def _render(self) -> None:
+        with self._lock:
+            tasks = list(self.tasks)
+        received_total = 0
+        for task in tasks:
+            received = task._drain()
+            received_total += received
+            if task._bar is None and (received or task.finished):
+                if self._total_bar is not None:
+                    self._total_bar.total += task.total
+                desc = task.name if len(task.name) <= 24 else task.name[:21] + "..."
+                task._bar = tqdm(total=task.total, initial=task.done - received, unit='B', unit_scale=True,
+                                 desc=desc, leave=not self.show_total)
+            if task._bar is not None and received:
+                task._bar.update(received)
+            if task.finished and not task._chunks:
+                if task._bar is not None:
+                    task._bar.close()
+                with self._lock:
+                    self.tasks.remove(task)
+        if self._total_bar is not None and received_total:
+            self._total_bar.update(received_total)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._render()
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._render()
+        for task in self.tasks:     # 未调用 finish 的任务（例如上传失败）
+            if task._bar is not None:
+                task._bar.close()
+        if self._total_bar is not None:
+            self._total_bar.close()
+
+
+class TitleStatus:
+    """
+    在终端标题栏显示任务的进度，用于前台正在进行交互式输入、不能输出进度条的情况：
+    标题栏不在输出区域内，不会打乱 InquirerPy 的界面。退出时恢复原来的标题。
+        with TitleStatus(task):
+            metadata = collect_metadata(...)
+    输出不是终端时不做任何事。
+    """
+
+    def __init__(self, task: TransferTask, interval: float = 0.5):
+        self.task = task
+        self.interval = interval
+        self.enabled = sys.stdout.isatty()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self) -> TitleStatus:
+        if self.enabled:
+            self._emit("\033[22;0t")   # 保存当前标题
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if not self.enabled:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._emit("\033[23;0t")       # 恢复标题
+
+    @staticmethod
+    def _emit(sequence: str) -> None:
+        # 一次 write 写完整个转义序列，不会与前台界面的输出交错
+        os.write(sys.stdout.fileno(), sequence.encode())
+
+    def _run(self) -> None:
+        start = time.monotonic()
+        while not self._stop.wait(self.interval):
+            self.task._drain()
+            if self.task.finished:
+                text = "byrdocs: 上传完成"
+            else:
+                percent = self.task.done / self.task.total if self.task.total else 1
+                speed = self.task.done / max(time.monotonic() - start, 1e-3) / 1024**2
+                text = f"byrdocs: 上传中 {percent:.0%} ({speed:.1f} MB/s)"
+            self._emit(f"\033]0;{text}\007")
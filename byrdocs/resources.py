@@ -5,4 +5,17 @@ title = '''    __                   __
 /_.___/\\__, /_/   \\__,_/\\____/\\___/____/  
       /____/                                                                       
 '''
-# print(title)
\ No newline at end of file
+# print(title)
+
+info = lambda s: f"\033[1;94m{s}\033[0m"
+error = lambda s: f"\033[1;31m{s}\033[0m"
+warn = lambda s: f"\033[1;33m{s}\033[0m"
+quote = lambda s: f"\033[37m{s}\033[0m"
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} TB"
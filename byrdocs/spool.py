@@ -0,0 +1,101 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import io
+import os
+import tempfile
+from typing import BinaryIO
+
+from byrdocs.config import MB
+from byrdocs.fingerprint import CHUNK_SIZE, StreamDigests, type_of_magic
+
+'''
+把只能读取一次的数据流（如标准输入）暂存下来，读取的同时计算 MD5 和文件类型。
+
+上传前必须先知道 MD5 才能向服务器申请上传，因此数据需要暂存。不超过 MAX_MEMORY 的数据
+保存在内存中；超过后转存到临时文件，内存占用与数据流大小无关，之后按文件路径分块上传。
+'''
+
+MAX_MEMORY = 64 * MB
+
+
+class Spool:
+    """
+    用法:
+        with Spool(sys.stdin.buffer) as spool:
+            key = f"{spool.md5}.{spool.file_type}"
+            uploader.upload(spool.source, data)
+    不传入 stream 时可以用 write 逐块写入（例如边打包边写入），写完后调用 finish。
+    """
+
+    def __init__(self, stream: BinaryIO | None = None, etag: bool = False, max_memory: int = MAX_MEMORY,
+                 dir: str | None = None):
+        self.digests = StreamDigests(etag=etag)
+        self.path: str | None = None
+        self.file_type = "unsupported"
+        self._max_memory = max_memory
+        self._dir = dir
+        self._buffer: io.BytesIO | None = io.BytesIO()
+        self._file: BinaryIO | None = None
+        self._magic_number = b""
+        if stream is None:
+            return
+        try:
+            while chunk := stream.read(CHUNK_SIZE):
+                self.write(chunk)
+            self.finish()
+        except BaseException:
+            self.close()
+            raise
+
+    def write(self, chunk: bytes) -> None:
+        if len(self._magic_number) < 4:
+            self._magic_number += chunk[:4 - len(self._magic_number)]
+        self.digests.update(chunk)
+        if self._buffer is not None and self._buffer.tell() + len(chunk) > self._max_memory:
+            fd, self.path = tempfile.mkstemp(prefix="byrdocs-", suffix=".spool", dir=self._dir)
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        (self._buffer if self._buffer is not None else self._file).write(chunk)
+
+    def finish(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self.file_type = type_of_magic(self._magic_number)
+
+    def __enter__(self) -> Spool:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    @property
+    def md5(self) -> str:
+        return self.digests.md5
+
+    @property
+    def etag(self) -> str:
+        return self.digests.etag
+
+    @property
+    def size(self) -> int:
+        return self.digests.size
+
+    @property
+    def source(self) -> str | BinaryIO:
+        """传给 Uploader.upload 的上传来源：临时文件路径，或定位到开头的内存缓冲区"""
+        if self.path is not None:
+            return self.path
+        self._buffer.seek(0)
+        return self._buffer
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.path = None
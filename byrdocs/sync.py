@@ -0,0 +1,143 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import Iterator
+
+from byrdocs.fingerprint import HashCache, fingerprint, get_file_type
+from byrdocs.history_manager import UploadHistory
+
+'''
+将本地目录与上传历史比对，只上传历史中没有的文件。
+
+哈希缓存以 (大小, 修改时间) 判断文件是否变化，目录未变化时重复同步只需 stat，
+不会重新读取文件内容。
+'''
+
+SUFFIXES = (".pdf", ".zip")
+
+
+def scan(directory: str) -> Iterator[tuple[str, os.stat_result]]:
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file() and entry.name.endswith(SUFFIXES):
+                    yield os.path.abspath(entry.path), entry.stat()
+
+
+class SyncPlan:
+    def __init__(self):
+        self.uploaded: list[tuple[str, str, int]] = []      # (path, key, size)，历史中已有
+        self.pending: list[tuple[str, str, int]] = []       # 需要上传
+        self.duplicates: list[tuple[str, str, int]] = []    # 与目录中另一个待上传文件内容相同
+        self.unsupported: list[str] = []
+
+    @staticmethod
+    def total(entries: list[tuple[str, str, int]]) -> int:
+        return sum(size for _, _, size in entries)
+
+
+def _key_of(path: str, stat: os.stat_result, cache: HashCache) -> str | None:
+    if (entry := cache.lookup(path, stat)) is not None:
+        return None if entry["type"] == "unsupported" else f"{entry['md5']}.{entry['type']}"
+    if get_file_type(path) == "unsupported":
+        cache.store(path, "", "unsupported", stat)  # 记下结果，下次同步同样只需 stat
+        return None
+    return fingerprint(path, cache)
+
+
+def plan(directory: str, cache: HashCache, workers: int = 4) -> SyncPlan:
+    known = {line["md5"] for line in UploadHistory().get()}
+    files = list(scan(directory))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:   # 只有缓存未命中的文件才会真正读取
+        keys = list(executor.map(lambda item: _key_of(item[0], item[1], cache), files))
+    cache.save()
+
+    result = SyncPlan()
+    seen: set[str] = set()
+    for (path, stat), key in zip(files, keys):
+        if key is None:
+            result.unsupported.append(path)
+        elif key in known:
+            result.uploaded.append((path, key, stat.st_size))
+        elif key in seen:
+            result.duplicates.append((path, key, stat.st_size))
+        else:
+            seen.add(key)
+            result.pending.append((path, key, stat.st_size))
+    return result
+
+
+def sync(directory: str, token: str, dry_run: bool = False, workers: int = 4, verify: bool = False) -> int:
+    """返回上传失败的文件数"""
+    from byrdocs.config import baseURL
+    from byrdocs.resources import info, error, warn, quote, format_size
+
+    cache = HashCache()
+    result = plan(directory, cache, workers)
+    print(info("同步计划:"))
+    print(f"\t已上传: {len(result.uploaded)} 个文件，{format_size(SyncPlan.total(result.uploaded))}")
+    print(f"\t待上传: {len(result.pending)} 个文件，{format_size(SyncPlan.total(result.pending))}")
+    if result.duplicates:
+        print(f"\t重复内容: {len(result.duplicates)} 个文件，{format_size(SyncPlan.total(result.duplicates))}")
+    if result.unsupported:
+        print(warn(f"\t不支持的格式或文件损坏: {len(result.unsupported)} 个文件"))
+    if dry_run:
+        for path, key, size in result.pending:
+            print(quote(f"\t{key}  {format_size(size):>10}  {path}"))
+        return 0
+    if not result.pending:
+        print(info("没有需要上传的文件。"))
+        return 0
+
+    from byrdocs.progress import TransferProgress
+    from byrdocs.fingerprint import multipart_etag
+    from byrdocs import metrics
+    from byrdocs.uploader import Uploader, AlreadyExists
+
+    uploader = Uploader(token)
+    failed: list[str] = []
+
+    def upload(item: tuple[str, str, int]) -> None:
+        path, key, size = item
+        name = os.path.basename(path)
+        task = progress.add(name, size)
+        record = metrics.UploadRecord("sync", size)
+        record.concurrency = workers
+        try:
+            with record.phase("hash"):  # 哈希已在 plan 中算好，这里只有 verify 时的 ETag
+                etag = multipart_etag(path, cache) if verify else None
+            with record.phase("handshake"):
+                upload_response_data = uploader.request_upload(key)
+            status = uploader.upload(path, upload_response_data, callback=task, expected_etag=etag, record=record)
+            record.status = "skipped" if status == "skipped" else "uploaded"
+        except AlreadyExists:
+            record.status = "exists"
+            progress.write(warn(f"服务器上已存在: {name}"))
+        except Exception as e:
+            record.status = "failed"
+            failed.append(path)
+            progress.write(error(f"上传失败: {name}: {e}"))
+            return
+        else:
+            if status == "skipped":
+                progress.write(info(f"服务器上已有相同文件，跳过: {name}"))
+            else:
+                progress.write(info(f"已上传: {name}") + quote(f"  {baseURL}/files/{key}"))
+        finally:
+            task.finish()
+            metrics.save(record)
+        # 服务器上已存在的文件同样记入历史，下次同步直接跳过
+        UploadHistory().add(name, key, time())
+
+    with TransferProgress(show_total=True) as progress, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        list(executor.map(upload, result.pending))
+    cache.save()
+    return len(failed)
@@ -0,0 +1,148 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+'''
+可选的性能追踪，输出 Chrome trace event 格式的 JSON，可以在 https://ui.perfetto.dev 或
+chrome://tracing 中打开，查看各线程、各进程在哈希、申请上传、创建客户端、上传分块、
+写入历史和等待输入上分别花了多少时间。
+
+设置环境变量 BYRDOCS_TRACE=<文件> 或使用 `--trace <文件>` 开启。子进程（进程池、守护进程
+启动的上传）继承环境变量后追加写入同一文件。未开启时 span() 只多一次布尔判断。
+
+文件格式为 JSON Array Format：最先开启追踪的进程清空文件并写入 `[`，各进程退出时用一次
+O_APPEND 写入各自的事件，最先开启的进程最后写入 `]`。
+'''
+
+ENV = "BYRDOCS_TRACE"
+_ROOT_ENV = "BYRDOCS_TRACE_ROOT"    # 最先开启追踪的进程号，子进程据此知道自己不是根进程
+
+FLUSH_EVENTS = 10000
+
+enabled = False
+_path: str | None = None
+_root = False
+_events: list[dict] = []
+_named_threads: set[int] = set()
+_lock = threading.Lock()
+_null = nullcontext()
+
+
+def _now() -> float:
+    # perf_counter 在 Linux、macOS 和 Windows 上都是系统范围的单调时钟，不同进程的时间可以直接比较
+    return time.perf_counter_ns() / 1000
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name: str, cat: str, args: dict):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self) -> _Span:
+        self.start = _now()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = _now()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        tid = threading.get_native_id()
+        if tid not in _named_threads:
+            _named_threads.add(tid)
+            _events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+                            "args": {"name": threading.current_thread().name}})
+        _events.append({"name": self.name, "cat": self.cat, "ph": "X", "ts": self.start, "dur": end - self.start,
+                        "pid": os.getpid(), "tid": tid, "args": self.args})
+        if len(_events) >= FLUSH_EVENTS:
+            flush()
+
+
+def span(name: str, cat: str = "upload", **args):
+    """
+    用法:
+        with trace.span("handshake", key=key):
+            ...
+    也可以手动调用返回值的 __enter__ / __exit__，用于开始和结束不在同一个函数中的情况。
+    """
+    if not enabled:
+        return _null
+    return _Span(name, cat, args)
+
+
+def start(path: str | None = None) -> None:
+    """开启追踪；path 为空时使用环境变量 BYRDOCS_TRACE"""
+    global enabled, _path, _root
+    path = path or os.environ.get(ENV)
+    if not path or enabled:
+        return
+    _path = os.path.abspath(path)
+    # 设置环境变量，之后启动的子进程会自动开启追踪
+    os.environ[ENV] = _path
+    _root = os.environ.get(_ROOT_ENV) is None
+    if _root:
+        os.environ[_ROOT_ENV] = str(os.getpid())
+        with open(_path, "w") as f:
+            f.write("[\n")
+        atexit.register(_finish)
+    else:
+        _register_child()
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_after_fork)
+    # multiprocessing fork 出的子进程会先清空 Finalize，之后才执行 register_after_fork 注册的函数
+    import multiprocessing.util
+    multiprocessing.util.register_after_fork(flush, _register_child)
+    enabled = True
+
+
+def _register_child(*args) -> None:
+    # multiprocessing 的子进程以 os._exit 退出，不会执行 atexit，只会执行 Finalize
+    import multiprocessing.util
+    multiprocessing.util.Finalize(None, flush, exitpriority=0)
+    atexit.register(flush)
+
+
+def _after_fork() -> None:
+    # fork 出的子进程复制了父进程尚未写入的事件，需要丢弃，并改为以子进程的身份写入
+    global _events, _root, _lock
+    _events = []
+    _named_threads.clear()
+    _lock = threading.Lock()
+    if _root:
+        _root = False
+        atexit.unregister(_finish)
+        atexit.register(flush)
+
+
+def _write(text: str) -> None:
+    fd = os.open(_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, text.encode())
+    finally:
+        os.close(fd)
+
+
+def flush() -> None:
+    global _events
+    with _lock:
+        events, _events = _events, []
+    if events:
+        _write("".join(json.dumps(event, ensure_ascii=False) + ",\n" for event in events))
+
+
+def _finish() -> None:
+    flush()
+    # 最后一个事件后不能有逗号
+    _write(json.dumps({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "byrdocs"}}) + "\n]\n")
+
+
+start()     # 从父进程继承了 BYRDOCS_TRACE 时自动开启
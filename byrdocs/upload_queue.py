@@ -0,0 +1,209 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import time, sleep
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+from byrdocs.config import config_dir
+from byrdocs.fingerprint import HashCache, fingerprint, get_file_type, multipart_etag
+
+queue_dir = config_dir / "queue"
+
+'''
+离线上传队列：每个待上传文件在 ~/.config/byrdocs/queue/ 下对应一个 JSON 文件，
+入队时即完成格式校验和哈希，网络恢复后由 `byrdocs queue drain` 并发上传。
+
+Job file format (<md5>.<pdf|zip>.json):
+{
+    "file": "/abs/path/to/file.pdf",
+    "key": "<md5>.pdf",
+    "size": 12345,
+    "mtime_ns": 1733110485531392000,
+    "queued_at": 1733110485.531392,
+    "attempts": 0,
+    "next_attempt": 0,
+    "last_error": null
+}
+'''
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 5        # 秒，第 n 次失败后等待 BACKOFF_BASE * 2 ** (n - 1)
+BACKOFF_MAX = 600
+
+
+class QueueError(Exception):
+    pass
+
+
+def _job_path(key: str) -> pathlib.Path:
+    return queue_dir / f"{key}.json"
+
+
+def _write_job(job: dict) -> None:
+    queue_dir.mkdir(parents=True, exist_ok=True)
+    path = _job_path(job["key"])
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp_path.open("w") as f:
+        json.dump(job, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+
+def jobs() -> list[dict]:
+    if not queue_dir.exists():
+        return []
+    result = []
+    for path in sorted(queue_dir.glob("*.json")):
+        try:
+            with path.open("r") as f:
+                result.append(json.load(f))
+        except (json.JSONDecodeError, OSError):
+            continue
+    result.sort(key=lambda job: job["queued_at"])
+    return result
+
+
+def enqueue(file: pathlib.Path | str, cache: HashCache | None = None) -> dict:
+    file = os.path.abspath(file)
+    if get_file_type(file) == "unsupported":
+        raise QueueError(f"不支持的文件格式或文件损坏: {file}")
+    stat = os.stat(file)
+    key = fingerprint(file, cache)
+    if (existing := next((job for job in jobs() if job["key"] == key), None)) is not None \
+            and existing["attempts"] < MAX_ATTEMPTS:    # 已放弃的任务重新入队时重置
+        raise QueueError(f"该文件已在队列中: {key}")
+    job = {
+        "file": file,
+        "key": key,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "queued_at": time(),
+        "attempts": 0,
+        "next_attempt": 0,
+        "last_error": None,
+    }
+    _write_job(job)
+    return job
+
+
+def remove(job: dict) -> None:
+    try:
+        _job_path(job["key"]).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _drain_lock():
+    # 同一时间只允许一个 drain，避免两个进程重复上传同一文件
+    if fcntl is None:
+        return None
+    queue_dir.mkdir(parents=True, exist_ok=True)
+    f = (queue_dir / ".lock").open("a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        raise QueueError("另一个 byrdocs queue drain 正在运行")
+    return f
+
+
+def drain(token: str, workers: int = 4, verify: bool = False) -> int:
+    """
+    上传队列中的文件直到队列清空或剩余任务均超过最大重试次数，返回剩余任务数。
+    每个任务的重试次数和下次重试时间写在任务文件中，中断后再次运行会接着处理。
+    """
+    from byrdocs.history_manager import UploadHistory
+    from byrdocs import metrics
+    from byrdocs.progress import TransferProgress
+    from byrdocs.resources import info, error, warn
+    from byrdocs.uploader import Uploader, AlreadyExists
+
+    lock = _drain_lock()
+    uploader = Uploader(token)
+    cache = HashCache()
+
+    def process(job: dict) -> None:
+        name = os.path.basename(job["file"])
+        task = progress.add(name, job["size"])
+        record = metrics.UploadRecord("queue", job["size"])
+        record.concurrency = workers
+        try:
+            stat = os.stat(job["file"])
+            if (stat.st_size, stat.st_mtime_ns) != (job["size"], job["mtime_ns"]):
+                raise QueueError("文件在入队后被修改，请重新加入队列")
+            with record.phase("hash"):
+                etag = multipart_etag(job["file"], cache) if verify else None
+            with record.phase("handshake"):
+                upload_response_data = uploader.request_upload(job["key"])
+            status = uploader.upload(job["file"], upload_response_data, callback=task, expected_etag=etag,
+                                     record=record)
+            record.status = "skipped" if status == "skipped" else "uploaded"
+        except AlreadyExists:
+            record.status = "exists"
+            progress.write(warn(f"服务器上已存在: {name}"))
+        except (QueueError, FileNotFoundError) as e:
+            record.status = "failed"
+            job["attempts"] = MAX_ATTEMPTS     # 重试也无法成功
+            job["last_error"] = str(e)
+            _write_job(job)
+            progress.write(error(f"{name}: {e}"))
+            return
+        except Exception as e:
+            record.status = "failed"
+            job["attempts"] += 1
+            job["last_error"] = str(e)
+            job["next_attempt"] = time() + min(BACKOFF_BASE * 2 ** (job["attempts"] - 1), BACKOFF_MAX)
+            _write_job(job)
+            progress.write(error(f"上传失败 ({job['attempts']}/{MAX_ATTEMPTS}): {name}: {e}"))
+            return
+        else:
+            progress.write(info(f"服务器上已有相同文件，跳过: {name}" if status == "skipped" else f"已上传: {name}"))
+        finally:
+            task.finish()
+            metrics.save(record)
+        UploadHistory().add(name, job["key"], time())
+        remove(job)
+
+    try:
+        with TransferProgress(show_total=True) as progress, ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            while remaining := [job for job in jobs() if job["attempts"] < MAX_ATTEMPTS]:
+                now = time()
+                ready = [job for job in remaining if job["next_attempt"] <= now]
+                if not ready:
+                    sleep(min(job["next_attempt"] for job in remaining) - now)
+                    continue
+                list(executor.map(process, ready))
+    finally:
+        cache.save()
+        if lock is not None:
+            lock.close()
+    return len(jobs())
+
+
+def status() -> None:
+    from byrdocs.resources import info, warn, quote, format_size
+
+    queued = jobs()
+    if not queued:
+        print(info("上传队列为空。"))
+        return
+    failed = [job for job in queued if job["attempts"] >= MAX_ATTEMPTS]
+    waiting = [job for job in queued if 0 < job["attempts"] < MAX_ATTEMPTS]
+    print(info(f"队列中共 {len(queued)} 个文件，{format_size(sum(job['size'] for job in queued))}"))
+    print(f"\t待上传: {len(queued) - len(failed) - len(waiting)}")
+    print(f"\t等待重试: {len(waiting)}")
+    print(f"\t已放弃: {len(failed)}")
+    for job in queued:
+        line = f"\t{job['key']}  {format_size(job['size']):>10}  {job['file']}"
+        if job["last_error"]:
+            print(warn(line) + quote(f"  [{job['attempts']}] {job['last_error']}"))
+        else:
+            print(quote(line))
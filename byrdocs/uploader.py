@@ -0,0 +1,281 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import threading
+from contextlib import nullcontext
+from time import time
+from typing import BinaryIO, Callable
+
+import boto3
+import boto3.s3.transfer
+import requests
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+
+from byrdocs.config import s3_region, MULTIPART_THRESHOLD, MULTIPART_CHUNKSIZE
+from byrdocs.fingerprint import HashCache, fingerprint, get_file_type, multipart_etag
+from byrdocs.history_manager import UploadHistory
+from byrdocs import endpoints, metrics, trace
+from byrdocs.metrics import UploadRecord
+
+
+class ServerError(Exception):
+    """服务器返回 `success: false`"""
+
+
+class AlreadyExists(ServerError):
+    """服务器上已存在同名文件"""
+
+
+class UnsupportedFile(Exception):
+    """不是 PDF 或 ZIP 文件"""
+
+
+class VerificationError(Exception):
+    """上传后服务器上的对象与本地文件不一致"""
+
+
+REQUEST_TIMEOUT = 30
+
+
+def _degraded(e: Exception) -> bool:
+    """上传出错是否是因为 S3 地址不可用（连接失败、超时或 5xx），而非凭证或请求本身的问题"""
+    if isinstance(e, S3UploadFailedError):
+        e = e.__context__ or e      # boto3 在处理 ClientError 时抛出，原异常保存在 __context__ 中
+    if isinstance(e, (BotoConnectionError, HTTPClientError)):     # HTTPClientError 包括 ReadTimeoutError
+        return True
+    if isinstance(e, ClientError):
+        return e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0) >= 500
+    return False
+
+
+def _size_of(file: pathlib.Path | str | BinaryIO) -> int:
+    if not hasattr(file, "read"):
+        return os.path.getsize(file)
+    position = file.tell()
+    size = file.seek(0, os.SEEK_END)
+    file.seek(position)
+    return size
+
+
+class Uploader:
+    """
+    封装一次或多次上传所需的连接。
+
+    `requests.Session` 复用到 byrdocs.org 的 HTTP 连接，`boto3.session.Session`
+    缓存已加载的服务模型，使后续创建 S3 客户端的开销大幅降低。
+    """
+
+    def __init__(self, token: str):
+        self.token = token
+        self.session = requests.Session()
+        self.boto_session = boto3.session.Session()
+        self._client_lock = threading.Lock()    # boto3 的 Session 不是线程安全的，创建出的客户端是
+        self.transfer_config = boto3.s3.transfer.TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNKSIZE
+        )
+
+    def request_upload(self, key: str) -> dict:
+        while True:
+            base = endpoints.api.current
+            try:
+                with trace.span("handshake", key=key, endpoint=base):
+                    response = self.session.post(
+                        f"{base}/api/s3/upload",
+                        headers={"Content-Type": "application/json", "Authorization": f"Bearer {self.token}"},
+                        data=json.dumps({"key": key}),
+                        timeout=REQUEST_TIMEOUT,
+                    )
+            except (requests.ConnectionError, requests.Timeout):
+                if endpoints.api.fail(base):
+                    continue
+                raise
+            if response.status_code >= 500 and endpoints.api.fail(base):
+                continue
+            break
+        try:
+            data = response.json()
+        except ValueError:
+            raise ServerError(f"未知错误: {response.text}")
+        if not data.get("success", False):
+            error_msg = data.get("error", response.text)
+            if "文件已存在" in error_msg:
+                raise AlreadyExists(error_msg)
+            raise ServerError(error_msg)
+        return data
+
+    def create_client(self, upload_response_data: dict):
+        credentials = upload_response_data["credentials"]
+        with trace.span("create_client"), self._client_lock:
+            s3_client = self.boto_session.client(
+                "s3",
+                aws_access_key_id=credentials["access_key_id"],
+                aws_secret_access_key=credentials["secret_access_key"],
+                aws_session_token=credentials["session_token"],
+                region_name=s3_region,
+                endpoint_url=endpoints.s3.current,
+            )
+        if trace.enabled:
+            self._trace_calls(s3_client)
+        return s3_client
+
+    @staticmethod
+    def _trace_calls(s3_client) -> None:
+        """每次 S3 API 调用（包括每个分块的 UploadPart 及其重试）记为一个 span"""
+        def before_call(model, params, context, **kwargs):
+            args = {"part": params["PartNumber"]} if "PartNumber" in params else {}
+            context["trace_span"] = trace.span(model.name, cat="s3", **args).__enter__()
+
+        def after_call(context, **kwargs):
+            if (span := context.pop("trace_span", None)) is not None:
+                span.__exit__(None, None, None)
+
+        s3_client.meta.events.register("before-call.s3", before_call)
+        s3_client.meta.events.register("after-call.s3", after_call)
+        s3_client.meta.events.register("after-call-error.s3", after_call)
+
+    def _track(self, s3_client, record: UploadRecord, size: int) -> None:
+        multipart = size >= self.transfer_config.multipart_threshold
+        record.size = record.size or size
+        record.part_size = self.transfer_config.multipart_chunksize if multipart else size
+        # 批量上传时调用方会填入同时上传的文件数
+        record.concurrency = record.concurrency or (self.transfer_config.max_concurrency if multipart else 1)
+
+        def count_retry(request, **kwargs):
+            # botocore 在请求的 context 中记录这是第几次尝试
+            if request.context.get("retries", {}).get("attempt", 1) > 1:
+                record.retries += 1
+
+        s3_client.meta.events.register("request-created.s3", count_retry)
+
+    def _transfer(self, s3_client, file: pathlib.Path | str | BinaryIO, upload_response_data: dict,
+                  callback: Callable[[int], None] | None) -> None:
+        transfer = s3_client.upload_fileobj if hasattr(file, "read") else s3_client.upload_file
+        transfer(
+            file if hasattr(file, "read") else str(file),
+            upload_response_data["bucket"],
+            upload_response_data["key"],
+            Callback=callback,
+            ExtraArgs={
+                "Tagging": "&".join(
+                    [f"{key}={value}" for key, value in upload_response_data["tags"].items()]
+                )
+            },
+            Config=self.transfer_config,
+        )
+
+    @staticmethod
+    def remote_object(s3_client, upload_response_data: dict) -> tuple[int, str] | None:
+        """返回服务器上同名对象的 (大小, ETag)，不存在时返回 None"""
+        try:
+            response = s3_client.head_object(Bucket=upload_response_data["bucket"], Key=upload_response_data["key"])
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["ContentLength"], response["ETag"].strip('"')
+
+    def upload(self, file: pathlib.Path | str | BinaryIO, upload_response_data: dict,
+               callback: Callable[[int], None] | None = None, expected_etag: str | None = None,
+               record: UploadRecord | None = None) -> str:
+        """
+        上传文件，返回 "uploaded"。file 也可以是定位到开头的二进制文件对象（如内存缓冲区）。
+        指定 record 时记录传输耗时、重试次数、分块大小和并发数。
+
+        指定 expected_etag 时先用临时凭证 HEAD 服务器上的同名对象：大小和 ETag 都一致则跳过上传，
+        返回 "skipped"；存在但不一致则重新上传，返回 "replaced"。上传后再次比对，
+        不一致时抛出 VerificationError。
+        """
+        s3_client = self.create_client(upload_response_data)
+        status = "uploaded"
+        if expected_etag is not None:
+            expected = (_size_of(file), expected_etag)
+            try:
+                remote = self.remote_object(s3_client, upload_response_data)
+            except ClientError:     # 临时凭证可能没有 HEAD 权限，此时照常上传
+                remote = None
+            if remote == expected:
+                return "skipped"
+            if remote is not None:
+                status = "replaced"
+        if record is not None:
+            self._track(s3_client, record, _size_of(file))
+        sent = [0]      # 本次尝试已报告的字节数，换地址重传时从进度中减去
+        sent_lock = threading.Lock()
+
+        def counted(chunk: int) -> None:
+            with sent_lock:
+                sent[0] += chunk
+            callback(chunk)
+
+        while True:
+            try:
+                with record.phase("transfer") if record is not None else nullcontext(), \
+                        trace.span("transfer", key=upload_response_data["key"], endpoint=s3_client.meta.endpoint_url):
+                    self._transfer(s3_client, file, upload_response_data, counted if callback is not None else None)
+                break
+            except Exception as e:
+                # boto3 已经在同一地址上重试过；地址不可用且还有其他候选地址时换一个重新上传
+                if not (_degraded(e) and endpoints.s3.fail(s3_client.meta.endpoint_url)):
+                    raise
+                with sent_lock:
+                    rewind, sent[0] = sent[0], 0
+                if callback is not None and rewind:
+                    callback(-rewind)       # 与 boto3 重试时相同，用负数回退进度
+                if record is not None:
+                    record.retries += 1
+                if hasattr(file, "read"):
+                    file.seek(0)
+                s3_client = self.create_client(upload_response_data)
+                if record is not None:
+                    self._track(s3_client, record, _size_of(file))
+        if expected_etag is not None:
+            try:
+                remote = self.remote_object(s3_client, upload_response_data)
+            except ClientError as e:
+                raise VerificationError(f"无法校验服务器上的文件: {e}")
+            if remote != expected:
+                raise VerificationError(
+                    f"服务器上的文件与本地不一致: 本地 {expected[0]} 字节 / {expected[1]}，"
+                    f"服务器 {'不存在' if remote is None else f'{remote[0]} 字节 / {remote[1]}'}"
+                )
+        return status
+
+
+def upload_file(uploader: Uploader, file: pathlib.Path | str, cache: HashCache | None = None,
+                callback: Callable[[int], None] | None = None, verify: bool = False,
+                record: UploadRecord | None = None) -> str:
+    """
+    非交互地完成哈希、握手和上传，并记录到上传历史，返回 `<md5>.<pdf|zip>`。
+    服务器上已存在时抛出 AlreadyExists，供批量上传的调用方自行决定如何处理。
+    """
+    record = record or UploadRecord()
+    if get_file_type(file) == "unsupported":
+        raise UnsupportedFile(str(file))
+    with trace.span("upload_file", file=str(file)):
+        return _upload_file(uploader, file, cache, callback, verify, record)
+
+
+def _upload_file(uploader: Uploader, file: pathlib.Path | str, cache: HashCache | None,
+                 callback: Callable[[int], None] | None, verify: bool, record: UploadRecord) -> str:
+    try:
+        with record.phase("hash"):
+            etag = multipart_etag(file, cache) if verify else None     # 先于 fingerprint，一次读取同时得到 MD5
+            key = fingerprint(file, cache)
+        with record.phase("handshake"):
+            upload_response_data = uploader.request_upload(key)
+        status = uploader.upload(file, upload_response_data, callback=callback, expected_etag=etag, record=record)
+        record.status = "skipped" if status == "skipped" else "uploaded"
+    except AlreadyExists:
+        record.status = "exists"
+        raise
+    except Exception:
+        record.status = "failed"
+        raise
+    finally:
+        metrics.save(record)
+    UploadHistory().add(pathlib.Path(file).name, key, time())
+    return key
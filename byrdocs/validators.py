@@ -0,0 +1,109 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+'''
+元信息各字段的校验和规范化，供交互式录入（yaml_init）和命令行参数录入（init_flags）共用。
+本模块不导入 InquirerPy、prompt_toolkit，也不保存任何状态，可在多个进程中同时使用。
+'''
+
+TYPES = ("book", "test", "doc")
+COURSE_TYPES = ("本科", "研究生")
+SEMESTERS = ("First", "Second")
+STAGES = ("期中", "期末")
+TEST_CONTENTS = ("原题", "答案")
+DOC_CONTENTS = ("思维导图", "题库", "答案", "知识点", "课件")
+
+colleges = ["信息与通信工程学院", "电子工程学院", "计算机学院（国家示范性软件学院）",
+            "网络空间安全学院", "人工智能学院", "智能工程与自动化学院", "集成电路学院",
+            "经济管理学院", "理学院", "未来学院", "人文学院", "数字媒体与设计艺术学院",
+            "马克思主义学院", "国际学院", "应急管理学院", "网络教育学院（继续教育学院）",
+            "玛丽女王海南学院", "体育部", "卓越工程师学院"]
+
+
+def college_validate(content):
+    content = content.strip()
+    if content == "":
+        return True  # 可留空
+    inputs = to_clear_list(content)
+    for s in inputs:
+        if s not in colleges:
+            return False
+    return True
+
+
+def not_empty(content: str | list):
+    if type(content) is str:
+        return content.strip() != ""
+    if type(content) is list:
+        return content != []
+    return bool(content)
+
+
+def is_vaild_year(year: str) -> bool:
+    if year == "":
+        return True  # 可留空
+    try:
+        year = int(year)
+    except ValueError:
+        return False
+    return 1000 <= year <= 2100
+
+
+def to_vaild_edition(edition: str) -> str | None:
+    edition = edition.strip()
+    if edition == "":
+        return ""  # 可留空
+    try:
+        edition = int(edition)
+    except ValueError:
+        # 转化汉字
+        edition = edition.removeprefix("第")
+        edition = edition.removesuffix("版")
+        edition = edition.strip()
+        汉字 = ["一", "二", "三", "四", "五", "六", "七", "八", "九", "十", "十一", "十二", "十三", "十四", "十五", "十六", "十七", "十八", "十九", "二十", "二十一", "二十二", "二十三", "二十四", "二十五", "二十六", "二十七", "二十八", "二十九", "三十", "三十一", "三十二", "三十三", "三十四", "三十五", "三十六", "三十七", "三十八", "三十九", "四十", "四十一", "四十二", "四十三", "四十四", "四十五", "四十六", "四十七", "四十八", "四十九", "五十", "五十一", "五十二",
+                  "五十三", "五十四", "五十五", "五十六", "五十七", "五十八", "五十九", "六十", "六十一", "六十二", "六十三", "六十四", "六十五", "六十六", "六十七", "六十八", "六十九", "七十", "七十一", "七十二", "七十三", "七十四", "七十五", "七十六", "七十七", "七十八", "七十九", "八十", "八十一", "八十二", "八十三", "八十四", "八十五", "八十六", "八十七", "八十八", "八十九", "九十", "九十一", "九十二", "九十三", "九十四", "九十五", "九十六", "九十七", "九十八", "九十九", "一百"]
+        try:
+            edition = int(edition)
+        except ValueError:
+            if edition in 汉字:
+                edition = 汉字.index(edition) + 1
+            else:
+                return None
+    return str(edition)
+
+
+def to_isbn13(isbns) -> list[str] | None:
+    import isbnlib     # 只有书籍需要，导入较慢
+
+    isbns = isbns.strip()
+    isbns = isbns.split("\n")
+    result: list[str] = []
+    for isbn in isbns:
+        isbn = isbn.strip()
+        if isbnlib.is_isbn10(isbn) or isbnlib.is_isbn13(isbn):
+            result.append(isbnlib.mask(isbnlib.to_isbn13(isbn)))
+        else:
+            return None
+    result = list(set(result))
+    return result
+
+
+def valid_year_period(start: str, end: str) -> bool:
+    if start == "" or end == "":
+        return False
+    try:
+        start = int(start)
+        end = int(end)
+    except ValueError:
+        return False
+    return end - start in [0, 1]
+
+
+def to_clear_list(content: str) -> list[str]:
+    # remove duplicate and empty
+    content: list = content.strip().split("\n")
+    content = [s.strip() for s in content]
+    # content = list(set(filter(None, content)))
+    seen = set()
+    content = [x for x in content if not (x in seen or seen.add(x))]    # keep the original order of list
+    return content
@@ -0,0 +1,161 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+from time import monotonic, sleep
+from typing import Callable
+
+'''
+监视目录，等待新出现的 PDF / ZIP 文件写入完成后交给回调处理。
+
+Linux 下使用 inotify，空闲时阻塞在 select 上，不占用 CPU；
+其他系统或 inotify 不可用时回退为定时扫描目录。
+'''
+
+SUFFIXES = (".pdf", ".zip")
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")   # wd, mask, cookie, len
+
+
+class InotifyBackend:
+    def __init__(self, directory: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch 失败")
+
+    def wait(self, timeout: float | None) -> list[str]:
+        """阻塞直到有事件或超时，返回发生变化的文件名。timeout 为 None 时一直等待。"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        buffer = os.read(self.fd, 64 * 1024)
+        names = []
+        offset = 0
+        while offset < len(buffer):
+            _, _, _, length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.append(os.fsdecode(name))
+        return names
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class PollingBackend:
+    def __init__(self, directory: str, interval: float = 2.0):
+        self.directory = directory
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout: float | None) -> list[str]:
+        sleep(self.interval if timeout is None else min(timeout, self.interval))
+        snapshot = self._scan()
+        names = [name for name, state in snapshot.items() if self.snapshot.get(name) != state]
+        self.snapshot = snapshot
+        return names
+
+    def close(self) -> None:
+        pass
+
+
+def create_backend(directory: str, polling: bool = False):
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyBackend(directory)
+        except (OSError, AttributeError):   # AttributeError: libc 中没有 inotify 函数
+            pass
+    return PollingBackend(directory)
+
+
+def watch(directory: str, on_ready: Callable[[str], None], settle: float = 2.0, polling: bool = False) -> None:
+    """
+    文件的大小和修改时间在 settle 秒内保持不变才视为写入完成，
+    避免扫描仪或拷贝程序尚未写完就开始上传。
+    """
+    backend = create_backend(directory, polling)
+    # path -> (size, mtime_ns, 最后一次变化的时间)
+    pending: dict[str, tuple[int, int, float]] = {}
+    try:
+        while True:
+            for name in backend.wait(settle / 2 if pending else None):
+                if name.lower().endswith(SUFFIXES) and not name.startswith("."):
+                    pending[os.path.join(directory, name)] = (-1, -1, monotonic())
+            now = monotonic()
+            for path, (size, mtime_ns, changed_at) in list(pending.items()):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:   # 被移走或删除
+                    del pending[path]
+                    continue
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                    pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+                elif now - changed_at >= settle and stat.st_size > 0:
+                    del pending[path]
+                    on_ready(path)
+    finally:
+        backend.close()
+
+
+def watch_and_upload(directory: str, token: str, workers: int = 4, polling: bool = False, verify: bool = False) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+    from byrdocs.config import baseURL
+    from byrdocs.fingerprint import HashCache
+    from byrdocs.resources import info, error, warn, quote
+    from byrdocs.metrics import UploadRecord
+    from byrdocs.uploader import Uploader, AlreadyExists, UnsupportedFile, upload_file
+
+    uploader = Uploader(token)
+    cache = HashCache()
+
+    def upload(path: str) -> None:
+        name = os.path.basename(path)
+        try:
+            record = UploadRecord("watch")
+            record.concurrency = workers
+            key = upload_file(uploader, path, cache, verify=verify, record=record)
+        except AlreadyExists:
+            print(warn(f"文件已存在，跳过: {name}"))
+        except UnsupportedFile:
+            print(warn(f"不支持的文件格式或文件损坏，跳过: {name}"))
+        except Exception as e:
+            print(error(f"上传失败: {name}: {e}"))
+        else:
+            print(info(f"已上传: {name}") + quote(f"  {baseURL}/files/{key}"))
+        finally:
+            cache.save()
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        watch(directory, lambda path: executor.submit(upload, path), polling=polling)
+    finally:
+        print(quote("等待进行中的上传完成..."))
+        executor.shutdown(wait=True)
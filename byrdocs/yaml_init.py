@@ -6,49 +6,30 @@ from InquirerPy import inquirer, prompt
 from InquirerPy.base.control import Choice
 from prompt_toolkit.completion import Completer, Completion
 from prompt_toolkit.document import Document
-import yaml
 import pinyin
-import isbnlib
 import os
 import time
 from byrdocs.history_manager import UploadHistory
-
-
-# init metadata
-data: dict[str, str | dict] = {}
-
-metadata: dict[str, str | dict] = {
-    "id": "", "url": "", "type": "", "data": data}
+from byrdocs import pdf_info, trace
+from byrdocs.fingerprint import format_filename
+from byrdocs.init_flags import new_metadata, render_metadata, save_metadata
+from byrdocs.validators import (colleges, college_validate, not_empty, is_vaild_year, to_vaild_edition, to_isbn13,
+                                valid_year_period, to_clear_list)
 
 
 def get_pinyin(text):
     return pinyin.get(text, format="strip", delimiter=" ")
 
 
-colleges = ["信息与通信工程学院", "电子工程学院", "计算机学院（国家示范性软件学院）",
-            "网络空间安全学院", "人工智能学院", "智能工程与自动化学院", "集成电路学院",
-            "经济管理学院", "理学院", "未来学院", "人文学院", "数字媒体与设计艺术学院",
-            "马克思主义学院", "国际学院", "应急管理学院", "网络教育学院（继续教育学院）",
-            "玛丽女王海南学院", "体育部", "卓越工程师学院"]
 colleges_pinyin = {c: get_pinyin(c) for c in colleges}
 college_completer = {s: None for s in colleges}
 
 course_name_completer = {s: None for s in UploadHistory().get_courses()}
 
 
-def college_validate(content):
-    content = content.strip()
-    if content == "":
-        return True  # 可留空
-    inputs = to_clear_list(content)
-    for s in inputs:
-        if s not in colleges:
-            return False
-    return True
-
-
 def ask_for_confirmation(prompt: str = "确认提交？") -> bool:
-    result = inquirer.confirm(prompt, default=True).execute()
+    with trace.span("prompt", cat="prompt", message=prompt):
+        result = inquirer.confirm(prompt, default=True).execute()
     return result
 
 
@@ -104,115 +85,17 @@ def get_recent_file_md5(file_name: str, time_strings: list[str]) -> str:
     return "Unknown"
 
 
-def not_empty(content: str | list):
-    if type(content) is str:
-        return content.strip() != ""
-    if type(content) is list:
-        return content != []
-    return bool(content)
-
-
-def is_vaild_year(year: str) -> bool:
-    if year == "":
-        return True  # 可留空
-    try:
-        year = int(year)
-    except ValueError:
-        return False
-    return 1000 <= year <= 2100
-
-
-def to_vaild_edition(edition: str) -> str | None:
-    edition = edition.strip()
-    if edition == "":
-        return ""  # 可留空
-    try:
-        edition = int(edition)
-    except ValueError:
-        # 转化汉字
-        edition = edition.removeprefix("第")
-        edition = edition.removesuffix("版")
-        edition = edition.strip()
-        汉字 = ["一", "二", "三", "四", "五", "六", "七", "八", "九", "十", "十一", "十二", "十三", "十四", "十五", "十六", "十七", "十八", "十九", "二十", "二十一", "二十二", "二十三", "二十四", "二十五", "二十六", "二十七", "二十八", "二十九", "三十", "三十一", "三十二", "三十三", "三十四", "三十五", "三十六", "三十七", "三十八", "三十九", "四十", "四十一", "四十二", "四十三", "四十四", "四十五", "四十六", "四十七", "四十八", "四十九", "五十", "五十一", "五十二",
-                  "五十三", "五十四", "五十五", "五十六", "五十七", "五十八", "五十九", "六十", "六十一", "六十二", "六十三", "六十四", "六十五", "六十六", "六十七", "六十八", "六十九", "七十", "七十一", "七十二", "七十三", "七十四", "七十五", "七十六", "七十七", "七十八", "七十九", "八十", "八十一", "八十二", "八十三", "八十四", "八十五", "八十六", "八十七", "八十八", "八十九", "九十", "九十一", "九十二", "九十三", "九十四", "九十五", "九十六", "九十七", "九十八", "九十九", "一百"]
-        try:
-            edition = int(edition)
-        except ValueError:
-            if edition in 汉字:
-                edition = 汉字.index(edition) + 1
-            else:
-                return None
-    return str(edition)
-
-
-def to_isbn13(isbns) -> list[str] | None:
-    isbns = isbns.strip()
-    isbns = isbns.split("\n")
-    result: list[str] = []
-    for isbn in isbns:
-        isbn = isbn.strip()
-        if isbnlib.is_isbn10(isbn) or isbnlib.is_isbn13(isbn):
-            result.append(isbnlib.mask(isbnlib.to_isbn13(isbn)))
-        else:
-            return None
-    result = list(set(result))
-    return result
-
-
-def valid_year_period(start: str, end: str) -> bool:
-    if start == "" or end == "":
-        return False
-    try:
-        start = int(start)
-        end = int(end)
-    except ValueError:
-        return False
-    return end - start in [0, 1]
-
-
-def format_filename(file_name: str) -> str | None:
-    file_name = file_name.strip()
-    prefixs = [
-        "https://byrdocs.org/files/",
-        "byrdocs.org/files/",
-        "/files/",
-        "files/",
-        "/",
-    ]
-    for pre in prefixs:
-        file_name = file_name.removeprefix(pre)
-    if file_name.endswith(".pdf"):
-        suffix = ".pdf"
-    elif file_name.endswith(".zip"):
-        suffix = ".zip"
-    else:
-        return None
-    file_name = file_name.removesuffix(suffix)
-    if len(file_name) == 32:
-        for c in file_name:
-            if c not in "0123456789abcdef":
-                return None
-        return file_name + suffix
-    return None
-
-
-def to_clear_list(content: str) -> list[str]:
-    # remove duplicate and empty
-    content: list = content.strip().split("\n")
-    content = [s.strip() for s in content]
-    # content = list(set(filter(None, content)))
-    seen = set()
-    content = [x for x in content if not (x in seen or seen.add(x))]    # keep the original order of list
-    return content
-
-
 def cancel(text="操作已取消。") -> None:
     print(f"\033[1;33m{text}\033[0m")
     exit(0)
 
 
-def ask_for_init(file_name: str = None, manually: bool = False) -> str:  # 若需要传入 file_name，需要带上后缀名
-    global metadata
+def ask_for_init(file_name: str = None, manually: bool = False, file_path: str = None) -> str:  # 若需要传入 file_name，需要带上后缀名
+    write_metadata(collect_metadata(file_name, manually, file_path))
+
+
+def collect_metadata(file_name: str = None, manually: bool = False, file_path: str = None) -> dict:
+    """交互式录入元信息并返回，不写入文件；用户取消时调用 cancel() 退出"""
     if not manually and ((recent_file_choices_resp := get_recent_file_choices()) is not None):
         recent_file_choices, time_strings = get_recent_file_choices()
         if file_name is None:
@@ -235,8 +118,7 @@ def ask_for_init(file_name: str = None, manually: bool = False) -> str:  # 若
             invalid_message="文件名格式错误，应为 MD5 值加文件后缀 (.pdf/.zip)"
         ).execute()
     file_name = format_filename(file_name)
-    metadata["id"] = file_name[:-4]
-    metadata["url"] = f"https://byrdocs.org/files/{file_name}"
+    metadata = new_metadata(file_name)
     if os.path.exists(metadata["id"]+".yml"):
         continued = inquirer.confirm(
             message=f"当前目录下已存在该文件的元信息文件，是否继续并覆盖？",
@@ -259,11 +141,17 @@ def ask_for_init(file_name: str = None, manually: bool = False) -> str:  # 若
     ).execute()
     metadata["type"] = type
 
+    # 传入了本地文件时，用 PDF 内嵌的标题和作者预填
+    prefill = {"title": None, "authors": []}
+    if file_path is not None and file_name.endswith(".pdf") and type in ("book", "doc"):
+        prefill = pdf_info.extract(file_path)
+
     if type == "book":
         questions = [
             {
                 "type": "input",
                 "message": "输入书籍标题:",
+                "default": prefill["title"] or "",
                 "validate": not_empty,
                 "mandatory_message": "此项为必填项",
                 "invalid_message": "此项为必填项",
@@ -272,6 +160,7 @@ def ask_for_init(file_name: str = None, manually: bool = False) -> str:  # 若
                 "type": "input",
                 "multiline": True,
                 "message": "输入作者:",
+                "default": "\n".join(prefill["authors"]),
                 "long_instruction": "每行输入一位作者，按 Enter 换行，按 ESC + Enter 提交",
                 "validate": not_empty,
                 "mandatory_message": "此项为必填项",
@@ -455,6 +344,7 @@ def ask_for_init(file_name: str = None, manually: bool = False) -> str:  # 若
                 "name": "title",
                 "type": "input",
                 "message": "输入标题:",
+                "default": prefill["title"] or "",
                 "long_instruction": "请自行总结一个合适的标题",
                 "validate": not_empty,
                 "invalid_message": "此项为必填项",
@@ -501,14 +391,12 @@ def ask_for_init(file_name: str = None, manually: bool = False) -> str:  # 若
             cancel()
 
     metadata["data"] = data
+    return metadata
+
 
-    yaml_content = (
-        f"# yaml-language-server: $schema=https://byrdocs.org/schema/{type}.yaml\n\n"
-    )
-    yaml_content += yaml.dump(metadata, indent=2,
-                              sort_keys=False, allow_unicode=True)
-    with open(f"{metadata['id']}.yml", "w", encoding="utf-8") as f:
-        f.write(yaml_content)
+def write_metadata(metadata: dict) -> None:
+    """把 collect_metadata 的结果写入当前目录下的 <md5>.yml"""
+    save_metadata(metadata)
     # print()
-    print(yaml_content)
+    print(render_metadata(metadata))
     print(f"\n\033[1;32m✔ 已成功写入 {metadata['id']}.yml\033[0m")
@@ -0,0 +1,275 @@
+# fit for python 3.9 and lower
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import zipfile
+import zlib
+from typing import BinaryIO, Iterator
+
+'''
+只读取 ZIP 末尾的目录结束记录（EOCD）和中央目录，不解压、不读取文件数据，
+列出成员并检查加密、空文件和压缩炸弹。中央目录按块流式解析，内存占用与文件大小无关。
+
+find_hosted 逐个解压 PDF / ZIP 成员并计算 MD5（不写入磁盘，同一时间只解压一个成员），
+找出已经单独上传过的文件，避免把已有的试卷打包后重复上传。其他成员不可能是已上传的文件，
+不解压；解压的总量不超过 HOSTED_SCAN_LIMIT，超出的成员不检查并在报告中列出。
+
+https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+'''
+
+EOCD = struct.Struct("<4s4H2LH")                   # 目录结束记录，22 字节
+ZIP64_LOCATOR = struct.Struct("<4sLQL")            # 20 字节
+ZIP64_EOCD = struct.Struct("<4sQ2H2L4Q")           # 56 字节
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")      # 46 字节
+
+MAX_COMMENT = 0xFFFF
+PREVIEW_MEMBERS = 20
+MAX_RATIO = 100                 # 单个成员的压缩比上限
+MAX_TOTAL_SIZE = 20 * 1024**3   # 解压后总大小上限
+HOSTED_RATIO = 0.5              # 已上传内容超过该比例时上传前需确认
+READ_CHUNK = 1024**2
+HOSTED_SUFFIXES = (".pdf", ".zip")     # 只有这两种文件可能单独上传过
+HOSTED_SCAN_LIMIT = 2 * 1024**3        # 查找已上传成员时最多解压的总大小
+
+
+class ZipError(Exception):
+    pass
+
+
+class ZipMember:
+    __slots__ = ("name", "size", "compressed_size", "offset", "encrypted", "is_dir")
+
+    def __init__(self, name: str, size: int, compressed_size: int, offset: int, encrypted: bool):
+        self.name = name
+        self.size = size
+        self.compressed_size = compressed_size
+        self.offset = offset
+        self.encrypted = encrypted
+        self.is_dir = name.endswith("/")
+
+
+def _decode_name(raw: bytes, utf8: bool) -> str:
+    if utf8:
+        return raw.decode("utf-8", errors="replace")
+    for encoding in ("utf-8", "gbk"):   # 中文 Windows 下打包的文件名通常是 GBK
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return raw.decode("cp437")
+
+
+def _find_central_directory(f: BinaryIO, size: int) -> tuple[int, int, int]:
+    """返回 (成员数, 中央目录大小, 中央目录偏移)"""
+    tail_size = min(size, EOCD.size + MAX_COMMENT)
+    f.seek(size - tail_size)
+    tail = f.read(tail_size)
+    pos = tail.rfind(b"PK\x05\x06")
+    if pos < 0:
+        raise ZipError("未找到 ZIP 目录结束记录，文件可能已损坏")
+    _, _, _, _, count, cd_size, cd_offset, _ = EOCD.unpack_from(tail, pos)
+    locator_pos = pos - ZIP64_LOCATOR.size
+    if locator_pos >= 0 and tail[locator_pos:locator_pos + 4] == b"PK\x06\x07":
+        _, _, zip64_offset, _ = ZIP64_LOCATOR.unpack_from(tail, locator_pos)
+        f.seek(zip64_offset)
+        record = f.read(ZIP64_EOCD.size)
+        if len(record) == ZIP64_EOCD.size and record[:4] == b"PK\x06\x06":
+            fields = ZIP64_EOCD.unpack(record)
+            count, cd_size, cd_offset = fields[7], fields[8], fields[9]
+    if cd_offset + cd_size > size:
+        raise ZipError("中央目录超出文件范围，文件可能已损坏")
+    return count, cd_size, cd_offset
+
+
+def _zip64_extra(extra: bytes, size: int, compressed_size: int, offset: int) -> tuple[int, int, int]:
+    pos = 0
+    while pos + 4 <= len(extra):
+        tag, length = struct.unpack_from("<2H", extra, pos)
+        if tag == 0x0001:
+            values = iter(struct.unpack_from(f"<{length // 8}Q", extra, pos + 4))
+            # 只有取值为 0xFFFFFFFF 的字段才会出现在 ZIP64 扩展字段中，且顺序固定
+            if size == 0xFFFFFFFF:
+                size = next(values, size)
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = next(values, compressed_size)
+            if offset == 0xFFFFFFFF:
+                offset = next(values, offset)
+            break
+        pos += 4 + length
+    return size, compressed_size, offset
+
+
+def iter_members(file: str) -> Iterator[ZipMember]:
+    with open(file, "rb", buffering=256 * 1024) as reader:     # 内存占用仅为一个缓冲区
+        size = os.fstat(reader.fileno()).st_size
+        count, _, cd_offset = _find_central_directory(reader, size)
+        reader.seek(cd_offset)
+        for _ in range(count):
+            header = reader.read(CENTRAL_HEADER.size)
+            if len(header) < CENTRAL_HEADER.size or header[:4] != b"PK\x01\x02":
+                raise ZipError("中央目录已损坏")
+            (_, _, _, flags, _, _, _, _, compressed_size, member_size,
+             name_length, extra_length, comment_length, _, _, _, offset) = CENTRAL_HEADER.unpack(header)
+            name = reader.read(name_length)
+            extra = reader.read(extra_length)
+            reader.read(comment_length)
+            member_size, compressed_size, offset = _zip64_extra(extra, member_size, compressed_size, offset)
+            yield ZipMember(_decode_name(name, bool(flags & 0x800)), member_size, compressed_size,
+                            offset, bool(flags & 0x1))
+
+
+class ZipReport:
+    def __init__(self):
+        self.count = 0
+        self.total_size = 0
+        self.compressed_size = 0
+        self.preview: list[ZipMember] = []
+        self.encrypted: list[str] = []
+        self.empty: list[str] = []
+        self.suspicious: list[str] = []     # 压缩比异常或数据区重叠的成员
+        self.errors: list[str] = []
+
+    @property
+    def is_bomb(self) -> bool:
+        return bool(self.suspicious) or self.total_size > MAX_TOTAL_SIZE
+
+    @property
+    def ok(self) -> bool:
+        return not (self.errors or self.encrypted or self.is_bomb)
+
+
+def inspect(file: str) -> ZipReport:
+    report = ZipReport()
+    ranges: list[tuple[int, int, str]] = []
+    try:
+        for member in iter_members(file):
+            report.count += 1
+            if len(report.preview) < PREVIEW_MEMBERS:
+                report.preview.append(member)
+            if member.is_dir:
+                continue
+            report.total_size += member.size
+            report.compressed_size += member.compressed_size
+            if member.encrypted:
+                report.encrypted.append(member.name)
+            if member.size == 0:
+                report.empty.append(member.name)
+            elif member.size > 1024**2 and member.size > MAX_RATIO * max(member.compressed_size, 1):
+                report.suspicious.append(member.name)
+            ranges.append((member.offset, member.compressed_size, member.name))
+    except (ZipError, struct.error) as e:
+        report.errors.append(str(e))
+        return report
+    # 多个成员共享同一段压缩数据是重叠型压缩炸弹的特征
+    ranges.sort()
+    for (offset, length, _), (next_offset, _, name) in zip(ranges, ranges[1:]):
+        if next_offset < offset + length:
+            report.suspicious.append(name)
+    return report
+
+
+def print_report(report: ZipReport) -> None:
+    from byrdocs.resources import info, error, warn, quote, format_size
+
+    if report.errors:
+        for message in report.errors:
+            print(error(message))
+        return
+    print(info(f"共 {report.count} 项，解压后 {format_size(report.total_size)}，压缩后 {format_size(report.compressed_size)}"))
+    for member in report.preview:
+        print(quote(f"\t{'' if member.is_dir else format_size(member.size):>10}  {member.name}"))
+    if report.count > len(report.preview):
+        print(quote(f"\t... 另有 {report.count - len(report.preview)} 项"))
+    if report.encrypted:
+        print(warn(f"加密的成员 ({len(report.encrypted)}): {'、'.join(report.encrypted[:5])}"))
+    if report.empty:
+        print(warn(f"空文件 ({len(report.empty)}): {'、'.join(report.empty[:5])}"))
+    if report.is_bomb:
+        print(error(f"疑似压缩炸弹: {'、'.join(report.suspicious[:5]) or '解压后总大小过大'}"))
+
+
+class HostedReport:
+    def __init__(self):
+        self.total_size = 0
+        self.hosted: list[tuple[str, int, str]] = []    # (成员名, 大小, md5)
+        self.unreadable: list[str] = []                 # 加密或无法解压的成员
+        self.skipped: list[str] = []                    # 超出 HOSTED_SCAN_LIMIT 未检查的成员
+        self.scanned_size = 0                           # 实际解压的大小
+
+    @property
+    def hosted_size(self) -> int:
+        return sum(size for _, size, _ in self.hosted)
+
+    @property
+    def ratio(self) -> float:
+        """已上传的成员占解压后总大小的比例"""
+        return self.hosted_size / self.total_size if self.total_size else 0.0
+
+
+def member_digests(file: str, limit: int = HOSTED_SCAN_LIMIT) -> Iterator[tuple[ZipMember, str | None]]:
+    """
+    逐个成员产生 (成员, MD5)，只解压 PDF / ZIP 成员。其他成员、加密或无法解压的成员 MD5 为 None，
+    解压总大小将超过 limit 的成员 MD5 为空字符串。
+    """
+    remaining = limit
+    with zipfile.ZipFile(file) as archive:
+        for item in archive.infolist():
+            if item.is_dir():
+                continue
+            utf8 = bool(item.flag_bits & 0x800)
+            # zipfile 对非 UTF-8 的文件名按 cp437 解码，还原后再按本模块的规则解码
+            name = _decode_name(item.filename.encode("utf-8" if utf8 else "cp437"), utf8)
+            member = ZipMember(name, item.file_size, item.compress_size, item.header_offset, bool(item.flag_bits & 0x1))
+            if not name.lower().endswith(HOSTED_SUFFIXES) or member.encrypted:
+                yield member, None
+                continue
+            if member.size > remaining:
+                yield member, ""
+                continue
+            remaining -= member.size
+            md5 = hashlib.md5()
+            try:
+                with archive.open(item) as f:
+                    while chunk := f.read(READ_CHUNK):
+                        md5.update(chunk)
+            except (zipfile.BadZipFile, NotImplementedError, RuntimeError, zlib.error, EOFError):
+                yield member, None
+                continue
+            yield member, md5.hexdigest()
+
+
+def find_hosted(file: str, known: set[str], limit: int = HOSTED_SCAN_LIMIT) -> HostedReport:
+    """known 为已上传文件的 md5（不含扩展名）"""
+    report = HostedReport()
+    for member, md5 in member_digests(file, limit):
+        report.total_size += member.size
+        if md5 == "":
+            report.skipped.append(member.name)
+            continue
+        if not member.name.lower().endswith(HOSTED_SUFFIXES):
+            continue
+        if md5 is None:
+            report.unreadable.append(member.name)
+            continue
+        report.scanned_size += member.size
+        if md5 in known:
+            report.hosted.append((member.name, member.size, md5))
+    return report
+
+
+def print_hosted_report(report: HostedReport) -> None:
+    from byrdocs.resources import info, warn, quote, format_size
+
+    if report.skipped:
+        print(warn(f"解压总量超过 {format_size(HOSTED_SCAN_LIMIT)}，{len(report.skipped)} 个 PDF / ZIP 成员未检查是否已上传"))
+    if not report.hosted:
+        return
+    print((warn if report.ratio >= HOSTED_RATIO else info)(
+        f"{len(report.hosted)} 个成员已上传过，共 {format_size(report.hosted_size)}，"
+        f"占解压后大小的 {report.ratio:.0%}:"))
+    for name, size, md5 in report.hosted[:PREVIEW_MEMBERS]:
+        print(quote(f"\t{format_size(size):>10}  {name}  ({md5})"))
+    if len(report.hosted) > PREVIEW_MEMBERS:
+        print(quote(f"\t... 另有 {len(report.hosted) - PREVIEW_MEMBERS} 项"))